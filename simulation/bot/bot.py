@@ -2,11 +2,17 @@
 Base bot class
 ==============
 
+Bot answers synchronously. AsyncBot answers in a coroutine, so that an asyncio
+conversation manager can wait on many bots at once: HTTPBot talks to a bot served over
+HTTP, ThreadedBot runs a blocking Bot in a thread.
 
 Author: Shuo Zhang
 """
 
+import asyncio
+import uuid
 from abc import ABC, abstractmethod
+import requests
 
 
 class Bot(ABC):
@@ -33,3 +39,79 @@ class Botbot(Bot):
 
     def generate_response(self, text):
         return ""
+
+
+class AsyncBot(ABC):
+    """Asynchronous bot abstract class"""
+
+    @abstractmethod
+    async def generate_response(self, text):
+        """Generates responses based on the given text.
+
+        Args:
+            text: user reply
+
+        Returns: agent response
+
+        """
+        pass
+
+    async def close(self):
+        """Releases the resources of the bot at the end of a dialogue."""
+        pass
+
+
+class ThreadedBot(AsyncBot):
+    """Runs a blocking bot in a thread of the event loop's default executor.
+
+    Like HTTPBot, a cancelled call keeps running in its thread until it returns.
+    """
+
+    def __init__(self, bot):
+        """
+        Args:
+            bot: Bot
+        """
+        self._bot = bot
+
+    async def generate_response(self, text):
+        return await asyncio.to_thread(self._bot.generate_response, text)
+
+
+class HTTPBot(AsyncBot):
+    """Bot served over HTTP.
+
+    Every user reply is POSTed as JSON {"session": session, "text": text} to the url,
+    and the bot answers with JSON {"text": response}. The session id tells the
+    dialogues of concurrent users apart.
+
+    Requests are made with blocking requests calls in threads of the event loop's
+    default executor, so at most as many bots as the executor has threads wait for a
+    response at a time (cf. AsyncConversationManager.run_many). Cancelling a call,
+    e.g. when a dialogue times out, does not stop its thread: the request keeps
+    running until it completes or reaches the timeout of the bot.
+    """
+
+    def __init__(self, url, session=None, timeout=30):
+        """
+        Args:
+            url: endpoint of the bot
+            session: session id; a random one if omitted
+            timeout: seconds to wait for a response
+        """
+        self.url = url
+        self.session = session if session is not None else uuid.uuid4().hex
+        self.timeout = timeout
+        self._http = requests.Session()
+
+    def _post(self, text):
+        response = self._http.post(self.url, json={"session": self.session, "text": text},
+                                   timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["text"]
+
+    async def generate_response(self, text):
+        return await asyncio.to_thread(self._post, text)
+
+    async def close(self):
+        self._http.close()
@@ -366,12 +366,12 @@ class DialogueManager():
         # Query the database
         for dact in dacts:
             if dact.intent == 'offer':
-                db_result = self.database.db_lookup(d_state)
+                db_result = self.database.db_lookup(
+                    d_state, self.MAX_DB_RESULTS, sample=True)
                 self.DSTracker.DState.requested_slot_filled = []
 
                 break
         if db_result:
-            random.shuffle(db_result)
             self.prev_db_result = db_result
         elif self.prev_db_result:
             db_result = self.prev_db_result
@@ -105,14 +105,15 @@ class MovieStateTracker():
         :return:
         """
 
-        cursor = self.database.SQL_connection.cursor()
-        cursor.execute("SELECT * FROM " + self.db_table_name)
-        tmp = cursor.fetchall()
-        self.DB_ITEMS = len(tmp)
-
+        # The table does not change between dialogues, so it is counted once
         if self.DB_ITEMS <= 0:
-            print('Warning! DST could not get number of DB items.')
-            self.DB_ITEMS = 110     # Default for CamRestaurants
+            cursor = self.database.SQL_connection.cursor()
+            cursor.execute("SELECT COUNT(*) FROM " + self.db_table_name)
+            self.DB_ITEMS = cursor.fetchone()[0]
+
+            if self.DB_ITEMS <= 0:
+                print('Warning! DST could not get number of DB items.')
+                self.DB_ITEMS = 110     # Default for CamRestaurants
 
         self.DState.initialize(args)
         if self.domain == 'Movie':
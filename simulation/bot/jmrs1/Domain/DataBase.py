@@ -15,6 +15,7 @@ __author__ = "Alexandros Papangelis"
 from abc import abstractmethod
 
 import os.path
+import random
 import sqlite3
 
 """
@@ -30,6 +31,20 @@ as .json files).
 """
 
 
+LIKE = " LIKE ? ESCAPE '\\'"
+
+
+def like_pattern(value):
+    """
+    Get the LIKE pattern matching a value as a substring.
+
+    :param value: the value
+    :return: the pattern, with the wildcards of the value escaped
+    """
+    value = str(value).replace('\\', '\\\\').replace('%', '\\%')
+    return '%' + value.replace('_', '\\_') + '%'
+
+
 class DataBase:
     def __init__(self, filename):
         """
@@ -51,11 +66,13 @@ class DataBase:
                              % filename)
 
     @abstractmethod
-    def db_lookup(self, dialogue_state):
+    def db_lookup(self, dialogue_state, MAX_DB_RESULTS=None, sample=False):
         """
         Perform a database query.
 
         :param dialogue_state: the current dialogue state
+        :param MAX_DB_RESULTS: upper limit for results to be returned
+        :param sample: if True, return a random sample of the matching items
         :return: result of the query
         """
         pass
@@ -81,6 +98,8 @@ class SQLDataBase(DataBase):
 
         self.SQL_connection = None
         self.db_table_name = None
+        self._where_cache = {}  # {(constrained slots, query ops): WHERE}
+        self._sql_cache = {}  # {(columns, WHERE, limit): SQL command}
 
         if isinstance(filename, str):
             if os.path.isfile(filename):
@@ -107,68 +126,119 @@ class SQLDataBase(DataBase):
             raise ValueError('Unacceptable value for database file name: %s '
                              % filename)
 
-    def db_lookup(self, DState, MAX_DB_RESULTS=None):
+    def db_lookup(self, DState, MAX_DB_RESULTS=None, sample=False):
         """
-        Perform an SQL query
+        Perform an SQL query. Slot values are matched as substrings, passed
+        to SQLite as parameters.
 
         :param DState: the current dialogue state
         :param MAX_DB_RESULTS: upper limit for results to be returned
+        :param sample: if True, return a random sample of the matching items,
+                       in random order, instead of the first ones
         :return: the results of the SQL query
         """
-        # Query the database
+        where, params = self._where(DState)
         cursor = self.SQL_connection.cursor()
-        sql_command = " SELECT * FROM " + self.db_table_name + " "
-
-        args = ''
-        prev_arg = False
-        prev_query_arg = False
-
-        # Impose constraints
-        for slot in DState.slots_filled:
-            if DState.slots_filled[slot] and DState.slots_filled[slot] != \
-                    'dontcare':
-                if prev_arg:
-                    args += " AND "
-
-                args += slot + " LIKE \"%" + DState.slots_filled[slot] + "%\""
-                prev_arg = True
-
-        # Impose queries
-        if prev_arg and DState.slot_queries:
-            args += " AND ("
-
-        for slot in DState.slot_queries:
-            for slot_query in DState.slot_queries[slot]:
-                query = slot_query[0]
-                op = slot_query[1]
-
-                if prev_query_arg:
-                    args += f" {op} "
 
-                args += slot + " LIKE \'%" + query + "%\' "
-                prev_query_arg = True
-
-        if prev_arg and DState.slot_queries:
-            args += " ) "
+        if not sample:
+            sql_command = self._sql('*', where, MAX_DB_RESULTS)
+            if MAX_DB_RESULTS:
+                params.append(MAX_DB_RESULTS)
+            cursor.execute(sql_command, params)
+            return self._rows(cursor, cursor.fetchall())
+
+        # Sample on the row ids of the matches, so that only the returned
+        # items are read in full
+        row_ids = [row_id for row_id, in
+                   cursor.execute(self._sql('rowid', where), params)]
+        row_ids = random.sample(
+            row_ids, min(len(row_ids), MAX_DB_RESULTS or len(row_ids)))
+        if not row_ids:
+            return []
+        db_result = cursor.execute(
+            self._sql('rowid, *', 'rowid IN ({0})'.format(
+                ', '.join('?' * len(row_ids)))), row_ids).fetchall()
+        order = {row_id: i for i, row_id in enumerate(row_ids)}
+        db_result.sort(key=lambda db_item: order[db_item[0]])
+        return self._rows(cursor, [db_item[1:] for db_item in db_result],
+                          skip=1)
+
+    def _where(self, DState):
+        """
+        Build the WHERE clause of a lookup, with one LIKE predicate per
+        constraint and per query of the dialogue state. The SQL only depends
+        on which slots are constrained, so it is cached per slot combination.
 
-        if args:
-            sql_command += " WHERE " + args + ";"
+        :param DState: the current dialogue state
+        :return: the WHERE clause ('' if none) and the list of its parameters
+        """
+        constraints = tuple(
+            slot for slot in DState.slots_filled
+            if DState.slots_filled[slot] and
+            DState.slots_filled[slot] != 'dontcare')
+        queries = tuple((slot, tuple(op for _, op in DState.slot_queries[slot]))
+                        for slot in DState.slot_queries)
+        key = (constraints, queries)
+
+        where = self._where_cache.get(key)
+        if where is None:
+            args = ' AND '.join(slot + LIKE for slot in constraints)
+            query_args = ''
+            for slot, ops in queries:
+                for op in ops:
+                    if query_args:
+                        query_args += f' {op} '
+                    query_args += slot + LIKE
+
+            # Queries are grouped in parentheses only after constraints
+            if args and query_args:
+                args += ' AND (' + query_args + ')'
+            else:
+                args += query_args
+            where = self._where_cache[key] = args
 
-        cursor.execute(sql_command)
-        db_result = cursor.fetchall()
+        params = [like_pattern(DState.slots_filled[slot])
+                  for slot in constraints]
+        params += [like_pattern(query) for slot in DState.slot_queries
+                   for query, _ in DState.slot_queries[slot]]
+        return where, params
 
-        result = []
+    def _sql(self, columns, where, limit=None):
+        """
+        Get the SQL of a SELECT on the table. The same string is returned for
+        the same arguments, so sqlite3 reuses its prepared statement.
 
-        if db_result:
-            # Get the slot names
-            slot_names = [i[0] for i in cursor.description]
-            for db_item in db_result:
-                result.append(dict(zip(slot_names, db_item)))
+        :param columns: columns to select
+        :param where: WHERE clause, '' for none
+        :param limit: whether to add a LIMIT parameter
+        :return: the SQL command
+        """
+        key = (columns, where, bool(limit))
+        sql_command = self._sql_cache.get(key)
+        if sql_command is None:
+            sql_command = 'SELECT {0} FROM {1}'.format(columns,
+                                                      self.db_table_name)
+            if where:
+                sql_command += ' WHERE ' + where
+            if limit:
+                sql_command += ' LIMIT ?'
+            self._sql_cache[key] = sql_command
+        return sql_command
+
+    @staticmethod
+    def _rows(cursor, db_result, skip=0):
+        """
+        Convert result rows to dictionaries keyed by column name.
 
-        if MAX_DB_RESULTS:
-            return result[:MAX_DB_RESULTS]
-        else:
-            return result
+        :param cursor: cursor that executed the query
+        :param db_result: the rows
+        :param skip: number of leading columns of the query missing from rows
+        :return: list of dictionaries
+        """
+        if not db_result:
+            return []
+        slot_names = [i[0] for i in cursor.description[skip:]]
+        return [dict(zip(slot_names, db_item)) for db_item in db_result]
 
     def get_table_name(self):
         """
@@ -200,11 +270,13 @@ class JSONDataBase(DataBase):
         """
         super(JSONDataBase, self).__init__(filename)
 
-    def db_lookup(self, dialogue_state):
+    def db_lookup(self, dialogue_state, MAX_DB_RESULTS=None, sample=False):
         """
         Placeholder to query the json database
 
         :param dialogue_state: the current dialogue state
+        :param MAX_DB_RESULTS: upper limit for results to be returned
+        :param sample: if True, return a random sample of the matching items
         :return: the result of the query
         """
         return []
@@ -14,9 +14,14 @@ __author__ = "Alexandros Papangelis"
 from simulation.bot.jmrs1.Dialogue.Action import DialogueAct, DialogueActItem, Operator
 from simulation.bot.jmrs1.Domain.Ontology import Ontology
 from simulation.bot.jmrs1.Domain.DataBase import DataBase, SQLDataBase, JSONDataBase
+from simulation.cache import file_hash
+from simulation.nlp.aho_corasick import AhoCorasick
 
+import json
+import os
 import string
 import re
+import tempfile
 
 """
 DummyNLU is a basic implementation of NLU designed to work for Slot-Filling 
@@ -25,6 +30,175 @@ Conversational Agents, sanity checks, and to aid debugging.
 """
 
 
+# Slots holding comma separated lists of values
+MULTI_VALUED_SLOTS = ['actors', 'genres', 'plot_keywords']
+
+# Version of the saved slot values; bump when their layout changes
+SLOT_VALUES_VERSION = 1
+
+# Synonyms rewritten by raw_utterance, in order. A step is either a
+# replacement (old, new), applied as str.replace(old, new), or a branch: a
+# list of (test, replacements) of which only the first whose test occurs in
+# the utterance is applied; a None test always applies. Steps see the result
+# of the previous ones, e.g. 'released' becomes 'title_year' and then
+# 'title_title_year'.
+RAW_UTTERANCE_REWRITES = [
+    [('director name', [('director name', 'director_name')]),
+     (None, [('director ', 'director_name'),
+             ('directors', 'director_name'),
+             ('directed', 'director_name')])],
+    [('imdb score', [('imdb score', 'imdb_score')]),
+     ('score', [('score', 'imdb_score')]),
+     ('imdb', [('imdb', 'imdb_score')]),
+     (None, [('rating', 'imdb_score')])],
+    ('genre ', 'genres '),
+    ('moive ', 'genres '),
+    ('moives', 'genres'),
+    ('plot ', 'plot_keywords'),
+    [('more', [('more', 'plot_keywords')]),
+     ('about', [('about', 'plot_keywords')]),
+     ('storyline', [('storyline', 'plot_keywords')])],
+    ('actor names', 'actors'),
+    ('acted', 'actors'),
+    ('actor ', 'actors '),
+    ('stars', 'actors'),
+    ('star', 'actors'),
+    ('released', 'title_year'),
+    ('release', 'title_year'),
+    ('year', 'title_year'),
+    ('long', 'duration'),
+]
+
+class KeywordPatterns():
+    """
+    A list of patterns (regular expressions, mostly plain keywords) matched as
+    whole words, as re.search(r'\b<pattern>\b', utterance) would. The
+    patterns are compiled once into a single alternation, instead of one
+    regex per pattern and search.
+    """
+
+    def __init__(self, patterns):
+        """
+        Compile the patterns.
+
+        :param patterns: list of patterns; a pattern that is not a valid
+                         regular expression is matched literally
+        """
+        self.patterns = list(patterns)
+        self._regexes = None
+
+        alternatives = []
+        for p in self.patterns:
+            try:
+                re.compile(p)
+            except re.error:
+                p = re.escape(p)
+            alternatives.append(p)
+
+        # A zero-width match at every position where some pattern occurs
+        self._any = re.compile(r'(?=\b(?:{0})\b)'.format(
+            '|'.join('(?:{0})'.format(p) for p in alternatives))) \
+            if alternatives else None
+
+        # At a given position, the alternation takes the earliest pattern of
+        # the list that occurs there; the named group tells which one
+        self._which = re.compile(r'(?=\b(?:{0})\b)'.format(
+            '|'.join('(?P<p{0}>{1})'.format(i, p)
+                     for i, p in enumerate(alternatives)))) \
+            if alternatives else None
+        self._alternatives = alternatives
+
+    def first(self, utterance):
+        """
+        Find the earliest pattern of the list that occurs in the utterance.
+
+        :param utterance: a string
+        :return: the pattern, or None if no pattern occurs
+        """
+        if self._any is None:
+            return None
+
+        best = None
+        for match in self._any.finditer(utterance):
+            which = self._which.match(utterance, match.start())
+            i = int(which.lastgroup[1:])
+            if best is None or i < best:
+                best = i
+        return None if best is None else self.patterns[best]
+
+    def findall(self, utterance):
+        """
+        Find all the patterns that occur in the utterance.
+
+        :param utterance: a string
+        :return: the patterns, in list order
+        """
+        if self._any is None or not self._any.search(utterance):
+            return []
+
+        if self._regexes is None:
+            self._regexes = [re.compile(r'\b{0}\b'.format(p))
+                             for p in self._alternatives]
+        return [p for p, regex in zip(self.patterns, self._regexes)
+                if regex.search(utterance)]
+
+
+
+class RewriteTable():
+    """
+    Applies a table of rewrite steps (cf. RAW_UTTERANCE_REWRITES) to
+    utterances. Most utterances contain none of the strings the table looks
+    for, and then no step changes them; all those strings are compiled into
+    one regex, so such utterances are checked in a single pass and returned
+    as they are. The steps are applied one after the other only to the
+    others, which keeps the results identical to chained str.replace calls.
+    """
+
+    def __init__(self, steps):
+        """
+        Compile the table.
+
+        :param steps: list of replacements (old, new) and branches
+                      [(test, [(old, new), ...]), ...]
+        """
+        self.steps = list(steps)
+        strings = set()
+        for step in self.steps:
+            if isinstance(step, tuple):
+                strings.add(step[0])
+                continue
+            for test, replacements in step:
+                if test is not None:
+                    strings.add(test)
+                strings.update(old for old, _ in replacements)
+
+        # Longest first, so that no alternative hides a longer one
+        self._strings = re.compile('|'.join(
+            re.escape(string)
+            for string in sorted(strings, key=len, reverse=True)))
+
+    def rewrite(self, utterance):
+        """
+        Rewrite an utterance.
+
+        :param utterance: a string
+        :return: the rewritten string
+        """
+        if not self._strings.search(utterance):
+            return utterance
+
+        for step in self.steps:
+            if isinstance(step, tuple):
+                utterance = utterance.replace(*step)
+                continue
+            for test, replacements in step:
+                if test is None or test in utterance:
+                    for old, new in replacements:
+                        utterance = utterance.replace(old, new)
+                    break
+        return utterance
+
+
 class MovieNLU():
     def __init__(self, args):
         """
@@ -39,6 +213,7 @@ class MovieNLU():
         self.database = None
         self.requestable_only_slots = None
         self.slot_values = None
+        self.prev_dact = []  # acts of the last user turn, for follow-up turns
         
         if 'ontology' not in args:
             raise AttributeError('MovieNLU: Please provide ontology!')
@@ -74,50 +249,13 @@ class MovieNLU():
         # values of requestable slots
         cursor = self.database.SQL_connection.cursor()
 
-        print('MovieNLU: Preprocessing Database...')
-
         # Get table name
         db_result = cursor.execute("select * from sqlite_master "
                                    "where type = 'table';").fetchall()
         if db_result and db_result[0] and db_result[0][1]:
             db_table_name = db_result[0][1]
 
-            self.slot_values = {}
-
-            # Get all entries in the database
-            all_items = cursor.execute("select * from " +
-                                       db_table_name + ";").fetchall()
-
-            i = 0
-
-            for item in all_items:
-                # Get column names
-                slot_names = [i[0] for i in cursor.description]
-
-                result = dict(zip(slot_names, item))
-
-                for slot in result:
-                    if slot in ['id']:
-                        continue
-
-                    if slot not in self.slot_values:
-                        self.slot_values[slot] = []
-                    
-                    if slot in ['actors', 'genres', 'plot_keywords']:
-                        temp_result = [x.strip() for x in result[slot].split(',')]
-                        temp_result = temp_result[:-1] + [x.strip() for x in temp_result[-1].split(' and ')]
-                        for val in temp_result:
-                            if val not in self.slot_values[slot]:
-                                self.slot_values[slot].append(val)
-                        continue
-
-                    if result[slot] not in self.slot_values[slot]:
-                        self.slot_values[slot].append(result[slot])
-
-                i += 1
-                if i % 2000 == 0:
-                    print(f'{float(i/len(all_items))*100}% done')
-            print('MovieNLU: Done!')
+            self.slot_values = self.load_slot_values(db_table_name)
         else:
             raise ValueError(
                 'Dialogue Manager cannot specify Table Name from database '
@@ -146,6 +284,22 @@ class MovieNLU():
                                  'it does not matter', 'it doesnt matter',
                                  'does not matter', 'doesnt matter']
 
+        # Each list of patterns, and the values of each informable slot,
+        # compiled once
+        self.help_patterns = KeywordPatterns(['help'])
+        self.bye_patterns = KeywordPatterns(self.bye_pattern)
+        self.thanks_patterns = KeywordPatterns(self.thanks_pattern)
+        self.dontlike_patterns = KeywordPatterns(self.dontlike_pattern)
+        self.watched_patterns = KeywordPatterns(self.watched_pattern)
+        self.deny_patterns = KeywordPatterns(self.deny_pattern)
+        self.affirm_patterns = KeywordPatterns(self.affirm_pattern)
+        self.dontcare_patterns = KeywordPatterns(self.dontcare_pattern)
+        self.informable_patterns = {
+            slot: KeywordPatterns(values)
+            for slot, values in self.ontology.ontology['informable'].items()}
+
+        self.rewrites = RewriteTable(RAW_UTTERANCE_REWRITES)
+
         punctuation = string.punctuation.replace('$', '')
         punctuation = punctuation.replace('_', '')
         punctuation = punctuation.replace('.', '')
@@ -154,6 +308,89 @@ class MovieNLU():
         punctuation += '.'
         self.punctuation_remover = str.maketrans('', '', punctuation)
 
+        # Values that the brute-force search in process_input can inform
+        # (values of informable slots other than name), normalised like the
+        # utterance and compiled into one automaton, so that the search is a
+        # single pass over the utterance
+        slot_vals = self.slot_values if self.slot_values \
+            else self.ontology.ontology['informable']
+        self.value_items = [
+            (slot, value) for slot in slot_vals
+            if slot in self.ontology.ontology['informable'] and slot != 'name'
+            for value in slot_vals[slot] if value]
+        self.value_matcher = AhoCorasick(
+            value.lower().translate(self.punctuation_remover)
+            for _, value in self.value_items)
+
+    def build_slot_values(self, db_table_name):
+        """
+        Collect the distinct values of every slot in one pass over the
+        database. Multi-valued slots (actors, genres, plot keywords) are split
+        into single values.
+
+        :param db_table_name: name of the database table
+        :return: a dictionary {slot: list of values in order of first
+                 appearance}
+        """
+        cursor = self.database.SQL_connection.cursor()
+        cursor.execute("select * from " + db_table_name + ";")
+        slot_names = [column[0] for column in cursor.description]
+
+        # Dictionaries keep the order of first appearance, like the lists
+        # they replace, but check membership in constant time
+        slot_values = {}
+        for item in cursor:
+            for slot, value in zip(slot_names, item):
+                if slot in ['id']:
+                    continue
+
+                values = slot_values.setdefault(slot, {})
+
+                if slot in MULTI_VALUED_SLOTS:
+                    temp_result = [x.strip() for x in value.split(',')]
+                    temp_result = temp_result[:-1] + [x.strip() for x in temp_result[-1].split(' and ')]
+                    values.update(dict.fromkeys(temp_result))
+                    continue
+
+                values[value] = None
+
+        return {slot: list(values) for slot, values in slot_values.items()}
+
+    def load_slot_values(self, db_table_name):
+        """
+        Load the slot values saved next to the database file. They are built
+        with build_slot_values and saved if the file is missing, or if it was
+        built from a database with a different checksum.
+
+        :param db_table_name: name of the database table
+        :return: a dictionary {slot: list of values}
+        """
+        db_file_name = self.database.db_file_name
+        path = os.path.splitext(db_file_name)[0] + '-slot-values.json'
+        checksum = file_hash(db_file_name)
+
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                saved = json.load(file)
+            if saved.get('version') == SLOT_VALUES_VERSION and \
+                    saved.get('checksum') == checksum:
+                return saved['slot_values']
+
+        slot_values = self.build_slot_values(db_table_name)
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                            suffix='.json')
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({'version': SLOT_VALUES_VERSION,
+                           'checksum': checksum,
+                           'slot_values': slot_values}, file)
+            os.replace(tmp_path, path)
+        except OSError:
+            print('Warning! MovieNLU could not save slot values to %s' % path)
+
+        return slot_values
+
     def initialize(self, args):
         """
         Nothing to do here.
@@ -163,48 +400,23 @@ class MovieNLU():
         """
         pass
 
+    def restart(self, args):
+        """
+        Forget the dialogue acts of the previous dialogue.
+
+        :param args:
+        :return:
+        """
+        self.prev_dact = []
+
     def raw_utterance(self, utterance, last_sys_act):
         utterance = utterance.rstrip().lower()
         utterance = utterance.translate(self.punctuation_remover)
         if last_sys_act and last_sys_act.intent == 'offer':
-            for p in self.deny_pattern:
-                match = re.search(r'\b{0}\b'.format(p), utterance)
-                if match:
-                    utterance = utterance + ' genres'
+            for p in self.deny_patterns.findall(utterance):
+                utterance = utterance + ' genres'
         utterance = utterance + ' '
-        if 'director name' in utterance:
-            utterance = utterance.replace('director name', 'director_name')
-        else:
-            utterance = utterance.replace('director ', 'director_name')
-            utterance = utterance.replace('directors', 'director_name')
-            utterance = utterance.replace('directed', 'director_name')
-        if 'imdb score' in utterance:
-            utterance = utterance.replace('imdb score', 'imdb_score')
-        elif 'score' in utterance:
-            utterance = utterance.replace('score', 'imdb_score')
-        elif 'imdb' in utterance:
-            utterance = utterance.replace('imdb', 'imdb_score')
-        else:
-            utterance = utterance.replace('rating', 'imdb_score')
-        utterance = utterance.replace('genre ', 'genres ')
-        utterance = utterance.replace('moive ', 'genres ')
-        utterance = utterance.replace('moives', 'genres')
-        utterance = utterance.replace('plot ', 'plot_keywords')
-        if 'more' in utterance:
-            utterance = utterance.replace('more', 'plot_keywords')
-        elif 'about' in utterance:
-            utterance = utterance.replace('about', 'plot_keywords')
-        elif 'storyline' in utterance:
-            utterance = utterance.replace('storyline', 'plot_keywords')
-        utterance = utterance.replace('actor names', 'actors')
-        utterance = utterance.replace('acted', 'actors')
-        utterance = utterance.replace('actor ', 'actors ')
-        utterance = utterance.replace('stars', 'actors')
-        utterance = utterance.replace('star', 'actors')
-        utterance = utterance.replace('released', 'title_year')
-        utterance = utterance.replace('release', 'title_year')
-        utterance = utterance.replace('year', 'title_year')
-        utterance = utterance.replace('long', 'duration')
+        utterance = self.rewrites.rewrite(utterance)
         return utterance.strip()
 
     def process_input(self, utterance, dialogue_state=None, dialogue_context=None):
@@ -240,52 +452,44 @@ class MovieNLU():
             utterance = self.raw_utterance(utterance, last_sys_act)
 
         # Check for dialogue ending
-        if dact.intent == 'UNK' and re.search(r'\b{0}\b'.format('help'), utterance):
+        if dact.intent == 'UNK' and self.help_patterns.first(utterance):
             dact.intent = 'help'
             return [dact]
 
         if dact.intent == 'UNK':
-            for p in self.thanks_pattern:
-                match = re.search(r'\b{0}\b'.format(p), utterance)
-                if match:
-                    dact.intent = 'moreinfo'
-                    return [dact]
+            if self.thanks_patterns.first(utterance) is not None:
+                dact.intent = 'moreinfo'
+                return [dact]
 
         #Check if the recommended movie is watched by the user or does not like this recommendation
         if last_sys_act and last_sys_act.intent == 'offer':
-            for p in self.affirm_pattern:
-                match = re.search(r'\b{0}\b'.format(p), utterance)
-                if match:
-                    for param in last_sys_act.params:
-                        if param.slot in dialogue_context.params:
-                            dialogue_context.update_offer(param.slot, param.value, 'watched it')
-                    dact.intent = 'feedback'
-                    dact.params = []
-                    for lsa_param in last_sys_act.params:
-                        if lsa_param.slot == 'name' and lsa_param.value:
-                            dact.params.append(lsa_param)
-                            return [dact]
+            if self.affirm_patterns.first(utterance) is not None:
+                for param in last_sys_act.params:
+                    if param.slot in dialogue_context.params:
+                        dialogue_context.update_offer(param.slot, param.value, 'watched it')
+                dact.intent = 'feedback'
+                dact.params = []
+                for lsa_param in last_sys_act.params:
+                    if lsa_param.slot == 'name' and lsa_param.value:
+                        dact.params.append(lsa_param)
+                        return [dact]
 
         if last_sys_act and dialogue_state.system_made_offer and last_sys_act.intent != 'feedback':
-            for p in self.watched_pattern:
-                match = re.search(r'\b{0}\b'.format(p), utterance)
-                if match:
-                    for param in last_sys_act.params:
-                        if param.slot in dialogue_context.params:
-                            dialogue_context.update_offer(param.slot, param.value, 'watched it')
-                    dact.intent = 'feedback'
-                    dact.params = []
-                    for lsa_param in last_sys_act.params:
-                        if lsa_param.slot == 'name' and lsa_param.value:
-                            dact.params.append(lsa_param)
-                            return [dact]
-            for p in self.dontlike_pattern:
-                match = re.search(r'\b{0}\b'.format(p), utterance)
-                if match:
-                    for param in last_sys_act.params:
-                        if param.slot in dialogue_context.params:
-                            dialogue_context.update_offer(param.slot, param.value, 'don\'t like')
-                    return self.prev_dact
+            if self.watched_patterns.first(utterance) is not None:
+                for param in last_sys_act.params:
+                    if param.slot in dialogue_context.params:
+                        dialogue_context.update_offer(param.slot, param.value, 'watched it')
+                dact.intent = 'feedback'
+                dact.params = []
+                for lsa_param in last_sys_act.params:
+                    if lsa_param.slot == 'name' and lsa_param.value:
+                        dact.params.append(lsa_param)
+                        return [dact]
+            if self.dontlike_patterns.first(utterance) is not None:
+                for param in last_sys_act.params:
+                    if param.slot in dialogue_context.params:
+                        dialogue_context.update_offer(param.slot, param.value, 'don\'t like')
+                return self.prev_dact
 
         #Check if the user is giving feedback on the movie
         if last_sys_act and last_sys_act.intent == 'feedback':
@@ -324,11 +528,8 @@ class MovieNLU():
 
         # Check for dialogue ending
         if dact.intent == 'UNK':
-            for p in self.bye_pattern:
-                match = re.search(r'\b{0}\b'.format(p), utterance)
-                if match:
-                    dact.intent = 'bye'
-                    break
+            if self.bye_patterns.first(utterance) is not None:
+                dact.intent = 'bye'
             
         if dact.intent == 'UNK':
             dact.intent = 'inform'
@@ -388,32 +589,28 @@ class MovieNLU():
 
                     found = False
 
-                    for p in self.ontology.ontology['informable'][word]:
-                        match = re.search(r'\b{0}\b'.format(p), utterance)
-                        if match:
-                            if word == 'name':
-                                dact.intent = 'offer'
-                            else:
-                                dact.intent = 'inform'
+                    p = self.informable_patterns[word].first(utterance)
+                    if p is not None:
+                        if word == 'name':
+                            dact.intent = 'offer'
+                        else:
+                            dact.intent = 'inform'
 
-                            dact.params.append(
-                                DialogueActItem(word, Operator.EQ, p))
-                            found = True
-                            break
+                        dact.params.append(
+                            DialogueActItem(word, Operator.EQ, p))
+                        found = True
                     
                     if not found:
                         # Search for dontcare (e.g. I want any area)
-                        for p in self.dontcare_pattern:
-                            match = re.search(r'\b{0}\b'.format(p), utterance)
-                            if match:
-                                dact.intent = 'inform'
-                                dact.params.append(
-                                    DialogueActItem(
-                                        word,
-                                        Operator.EQ,
-                                        'dontcare'))
-                                self.prev_dact = [dact]
-                                return [dact]
+                        if self.dontcare_patterns.first(utterance) is not None:
+                            dact.intent = 'inform'
+                            dact.params.append(
+                                DialogueActItem(
+                                    word,
+                                    Operator.EQ,
+                                    'dontcare'))
+                            self.prev_dact = [dact]
+                            return [dact]
 
                         dact.intent = 'request'
                         dact.params.append(
@@ -430,21 +627,15 @@ class MovieNLU():
         
         if dact.intent in ['UNK', 'inform'] and not dact.params:
             #print('DEBUG1 => intent is ' + dact.intent + ' for utterance ' + utterance)
-            slot_vals = self.ontology.ontology['informable']
-            if self.slot_values:
-                slot_vals = self.slot_values
-            for slot in slot_vals:
-                for value in slot_vals[slot]:
-                    if value and \
-                            value.lower().translate(self.punctuation_remover) \
-                            in utterance:
-                        if slot in self.ontology.ontology['informable'] and slot != 'name':
-                            dact.intent = 'offer'
+            # Values found in the utterance, in slot and value order
+            for i in sorted(self.value_matcher.find(utterance)):
+                slot, value = self.value_items[i]
+                dact.intent = 'offer'
 
-                            di = DialogueActItem(slot, Operator.EQ, value)
+                di = DialogueActItem(slot, Operator.EQ, value)
 
-                            if di not in dact.params:
-                                dact.params.append(di)
+                if di not in dact.params:
+                    dact.params.append(di)
         
         # Check if something has been missed (e.g. utterance is dont care and
         # there's no previous sys act)
@@ -510,3 +701,18 @@ class MovieNLU():
         :return:
         """
         pass
+
+
+if __name__ == '__main__':
+    import timeit
+    import yaml
+
+    with open('simulation/bot/jmrs1/config/movies_text.yaml', 'r') as file:
+        config = yaml.load(file, Loader=yaml.Loader)['DIALOGUE']
+    nlu = MovieNLU({'ontology': Ontology(config['ontology_path']),
+                    'database': SQLDataBase(config['db_path'])})
+    number = 100000
+    seconds = timeit.timeit(
+        lambda: nlu.raw_utterance('Who directed it and when was it released?',
+                                  None), number=number)
+    print('raw_utterance: {:.2f} us'.format(seconds / number * 1e6))
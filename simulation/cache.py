@@ -0,0 +1,139 @@
+"""
+Cache helpers
+=============
+
+Derived artifacts (indexes, parsed corpora) are stored under ``CACHE_DIR`` and keyed by
+a hash of the file they were built from, so a changed source file is never served a
+stale artifact. LRUCache is a bounded in-memory cache for per-utterance results.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+CACHE_DIR = "data/cache"
+
+_HASHES = {}  # {(path, size, mtime): digest}
+
+
+def file_hash(path, block_size=1 << 20):
+    """Computes the SHA-1 digest of a file.
+
+    The digest is memoised per process on the file's size and modification time, so
+    repeated lookups for an unchanged file do not re-read it.
+
+    Args:
+        path: file path
+        block_size: number of bytes read at a time
+
+    Returns: hex digest
+
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _HASHES:
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(block_size), b""):
+                sha1.update(block)
+        _HASHES[key] = sha1.hexdigest()
+    return _HASHES[key]
+
+
+def cache_path(namespace, digest):
+    """Returns the cache location for an artifact.
+
+    Args:
+        namespace: artifact type, e.g. "title_index"
+        digest: hash of the source file
+
+    Returns: path under the cache directory
+
+    """
+    return os.path.join(CACHE_DIR, namespace, digest)
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit, miss and eviction counters."""
+
+    _MISSING = object()
+
+    def __init__(self, max_size=1024):
+        """Creates an empty cache.
+
+        Args:
+            max_size: maximum number of entries; 0 disables caching
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Returns the cached value and marks it as recently used.
+
+        Args:
+            key: cache key
+            default: value returned on a miss
+
+        Returns: cached value or default
+
+        """
+        value = self._entries.get(key, self._MISSING)
+        if value is self._MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entry if full.
+
+        Args:
+            key: cache key
+            value: value
+
+        """
+        if self.max_size <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value, computing and storing it on a miss.
+
+        Args:
+            key: cache key
+            compute: function without arguments computing the value
+
+        Returns: value
+
+        """
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Removes all entries; counters are kept."""
+        self._entries.clear()
+
+    def stats(self):
+        """Returns the cache counters.
+
+        Returns: dictionary with hits, misses, evictions, size, max_size and hit_rate
+
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._entries), "max_size": self.max_size,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
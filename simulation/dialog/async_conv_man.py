@@ -0,0 +1,192 @@
+"""
+AsyncConversationManager
+========================
+
+Runs many simulated dialogues concurrently against bots that answer over the network
+(AsyncBot, e.g. HTTPBot). Dialogues are coroutines on one event loop: while a bot is
+answering, the loop advances the other dialogues, so throughput against a slow bot
+grows with the number of concurrent dialogues rather than shrinking with the number of
+dialogues. At most `concurrency` dialogues are open at a time, and a dialogue running
+longer than `timeout` seconds is cancelled and recorded as failed (the timeout takes
+effect while the dialogue waits for its bot).
+
+Users and bots keep per-dialogue state, so the manager asks factories for a fresh
+user and bot for every dialogue.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from simulation.dialog.conv_man import USER_TAG, AGENT_TAG, init_agenda
+
+
+class AsyncConversationManager:
+    """Asynchronous Conversation Manager"""
+
+    def __init__(self, user_factory, bot_factory, concurrency=100, timeout=None):
+        """
+        Args:
+            user_factory: function mapping the index of a dialogue to a simulated user
+            bot_factory: function mapping the index of a dialogue to an AsyncBot
+            concurrency: maximum number of dialogues running at a time
+            timeout: seconds after which a dialogue is cancelled; no limit if None
+        """
+        self._user_factory = user_factory
+        self._bot_factory = bot_factory
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    @staticmethod
+    async def run_dialogue(user, bot, age_mode="our", persona=True):
+        """Runs one conversation between a simulated user and a bot.
+
+        Args:
+            user: simulated user
+            bot: AsyncBot
+            age_mode: qfra/qrfa_test/our
+            persona: persona of simulator
+
+        Returns: Dialogue record, cf. ConversationManager.run_dialogue
+
+        """
+        result = {
+            "dialog": []
+        }
+        init_agenda(user, age_mode)
+        result["agenda"] = list(user.agenda)
+        user_utterance = user.init_dialog()
+        result["dialog"].append([USER_TAG, "Hello", "Non-disclose"])
+        while user_utterance.lower() != "stop":
+            system_utterance = await bot.generate_response(user_utterance)
+            user_utterance, sys_intent = user.generate_response(system_utterance,
+                                                                persona=persona)
+            result["dialog"].append([AGENT_TAG, system_utterance, sys_intent[0]])
+            result["dialog"].append([USER_TAG, user_utterance, user._current_intent])
+        result["persona"] = {"persona": user.persona, "preferences": user.preferences}
+        return result
+
+    async def _run_one(self, index, semaphore, age_mode, persona):
+        """Runs the index-th dialogue once a slot is free.
+
+        Args:
+            index: index of the dialogue
+            semaphore: semaphore bounding the number of open dialogues
+            age_mode: qfra/qrfa_test/our
+            persona: persona of simulator
+
+        Returns: dialogue record; {"index": index, "error": message} if the dialogue
+            failed or timed out, or if the user or the bot could not be created
+
+        """
+        async with semaphore:
+            bot = None
+            try:
+                user = self._user_factory(index)
+                bot = self._bot_factory(index)
+                result = await asyncio.wait_for(
+                    self.run_dialogue(user, bot, age_mode=age_mode, persona=persona),
+                    self.timeout)
+            except asyncio.TimeoutError:
+                result = {"error": "TimeoutError: dialogue exceeded {} s".format(self.timeout)}
+            except Exception as error:  # one failing dialogue must not stop the batch
+                result = {"error": "{}: {}".format(type(error).__name__, error)}
+            finally:
+                if bot is not None:
+                    await bot.close()
+        result["index"] = index
+        return result
+
+    async def run(self, n_dialogues, age_mode="our", persona=True):
+        """Runs dialogues concurrently on the running event loop.
+
+        Bots that block in threads (HTTPBot, ThreadedBot) use the loop's default
+        executor, whose size also bounds the number of bots answering at a time; cf.
+        run_many.
+
+        Args:
+            n_dialogues: number of dialogues
+            age_mode: qfra/qrfa_test/our
+            persona: persona of simulator
+
+        Returns: dialogue records in the order of their indices
+
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self._run_one(i, semaphore, age_mode, persona)
+                                      for i in range(n_dialogues)))
+
+    def run_many(self, n_dialogues, age_mode="our", persona=True):
+        """Runs dialogues concurrently on a new event loop, with one executor thread per
+        concurrent dialogue.
+
+        Args:
+            n_dialogues: number of dialogues
+            age_mode: qfra/qrfa_test/our
+            persona: persona of simulator
+
+        Returns: dialogue records in the order of their indices
+
+        """
+        async def main():
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=self.concurrency))
+            return await self.run(n_dialogues, age_mode=age_mode, persona=persona)
+
+        return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from simulation.bot.bot import HTTPBot
+    from simulation.user.movies.movies_simulated_user import MovieSimulatedUser
+    from simulation.user.user_generator import UserGenerator
+
+    with open("data/1224_ms.json", "r", encoding="utf-8") as f:
+        AGENT_TURNS = [[turn[1] for turn in dialogue if turn[0] == AGENT_TAG]
+                       for dialogue in json.load(f).values()]
+    SESSIONS = {}  # {session: number of answered turns}
+
+    class SlowBot(BaseHTTPRequestHandler):
+        """Local stand-in for an external bot: replays the agent turns of an annotated
+        dialogue, answering after 50 ms."""
+
+        def do_POST(self):
+            session = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["session"]
+            turn = SESSIONS.get(session, 0)
+            SESSIONS[session] = turn + 1
+            turns = AGENT_TURNS[int(session) % len(AGENT_TURNS)]
+            time.sleep(0.05)
+            body = json.dumps({"text": turns[turn % len(turns)]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowBot)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/".format(server.server_port)
+
+    n = 40
+    template = None
+    for concurrency in (1, 10, 40):
+        profiles = list(UserGenerator().population(n, seed=0))
+        if template is None:
+            template = MovieSimulatedUser("data/1224_ms.json", user=profiles[0])
+        manager = AsyncConversationManager(
+            lambda i: MovieSimulatedUser("data/1224_ms.json", corpus=template.corpus,
+                                         user=profiles[i], scorer=template.scorer),
+            lambda i: HTTPBot(url, session=str(i)), concurrency=concurrency, timeout=60)
+        SESSIONS.clear()
+        start = time.perf_counter()
+        records = manager.run_many(n)
+        elapsed = time.perf_counter() - start
+        turns = sum(SESSIONS.values())
+        print("concurrency {:2d}: {} dialogues, {} bot turns in {:.2f} s ({:.1f} turns/s)".format(
+            concurrency, n, turns, elapsed, turns / elapsed))
+    server.shutdown()
@@ -11,14 +11,19 @@ import os.path
 import random
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pprint import pprint
+import numpy as np
 import yaml
 from simulation.bot.jmrs1.ConversationalAgent.ConversationalSingleAgent import \
     ConversationalSingleAgent
 from simulation.nlp.movies import RESPONSE_TEMPLATES_MS
 from simulation.user.movies.movies_simulated_user import MovieSimulatedUser
 from simulation.user.human_user import HumanUser
+from simulation.user.simulated_user import SimulatedUser
+from simulation.user.user_generator import UserGenerator
 from simulation.bot.bot import Botbot
+from simulation.dialog.pacing import NoDelay
 
 
 
@@ -28,9 +33,16 @@ USER_TAG, AGENT_TAG = "user", "agent"
 class ConversationManager:
     """Conversation Manager"""
 
-    def __init__(self, user, bot):
+    def __init__(self, user, bot, pacing=None):
+        """
+        Args:
+            user: user
+            bot: bot
+            pacing: Pacing policy applied before every user reply; NoDelay if None
+        """
         self._user = user
         self._bot = bot
+        self._pacing = pacing if pacing is not None else NoDelay()
         self._history = []  # record the chats
         self._chat = None
 
@@ -89,25 +101,38 @@ class ConversationManager:
         Returns: Dialogue record
 
         """
+        ca = ConversationalSingleAgent(config)
+        ca.initialize()
+        result = self.run_dialogue(ca, age_mode=age_mode, persona=persona)
+        pprint(result)
+        return result
+
+    def run_dialogue(self, ca, age_mode="our", persona=True, verbose=True):
+        """Runs one conversation between the simulated user and an initialised agent.
+
+        Args:
+            ca: ConversationalSingleAgent
+            age_mode: qfra/qrfa_test/our
+            persona: persona of simulator
+            verbose: print the turns
+
+        Returns: Dialogue record; "timing" holds the seconds spent in pacing and in
+            computing the turns
+
+        """
+        start = time.monotonic()
+        paced = 0.0
         result = {
             "dialog": []
         }
-        ca = ConversationalSingleAgent(config)
-        ca.initialize()
-        if age_mode == "qfra":
-            self._user.init_agenda_qrfa()
-        elif age_mode == "qrfa_test":
-            self._user.init_agenda_qrfa_test()
-        elif age_mode == "our":
-            self._user.init_agenda()
-        else:
-            raise TypeError("Set age mode 'qfra', 'qrfa_test', or 'our'")
+        init_agenda(self._user, age_mode)
         result["agenda"] = list(self._user.agenda)
         user_utterance = self._user.init_dialog()
         self._history.append(user_utterance)
         result["dialog"].append([USER_TAG, "Hello", "Non-disclose"])
         while True:
-            print("USER: {}.   [{}]".format(user_utterance, self._user._current_intent))
+            if verbose:
+                print("USER: {}.   [{}]".format(user_utterance, self._user._current_intent))
             if user_utterance and user_utterance.lower() == "hi" or \
                     user_utterance.lower() == "hello" or user_utterance.lower() == "go":
                 system_utterance = ca.start_dialogue()
@@ -117,20 +142,139 @@ class ConversationManager:
             else:
                 system_utterance = ca.continue_dialogue(user_utterance)
 
-            time.sleep(1)
+            paced += self._pacing.wait()
             user_utterance, sys_intent = \
                 self._user.generate_response(system_utterance, persona=persona)
-            print("System: {}.    [{}]".format(system_utterance, sys_intent))
+            if verbose:
+                print("System: {}.    [{}]".format(system_utterance, sys_intent))
             result["dialog"].append([AGENT_TAG, system_utterance, sys_intent[0]])
-            print("-----------------------------------------------------------")
+            if verbose:
+                print("-----------------------------------------------------------")
             if not user_utterance:
                 print("ALERT")
             self._history.append(user_utterance)
             result["dialog"].append([USER_TAG, user_utterance, self._user._current_intent])
         result["persona"] = {"persona": self._user.persona, "preferences": self._user.preferences}
-        pprint(result)
+        result["timing"] = {"pacing": paced, "compute": time.monotonic() - start - paced}
         return result
 
+    @staticmethod
+    def run_many(config, n_dialogues, workers=None, dialogue_file="data/1224_ms.json",
+                 response_tempt=RESPONSE_TEMPLATES_MS, mode="ms", age_mode="our",
+                 persona=True, seed=None, pacing=None):
+        """Runs many simulated conversations over a pool of worker processes.
+
+        Every worker builds the agent and the simulated user once and reuses them; the
+        agent is reset and the user gets a new profile for every dialogue.
+        Profiles are drawn without replacement with UserGenerator.population, and each
+        dialogue seeds ``random`` from seed, so a seeded run is reproducible up to the
+        agent's own randomness.
+
+        Args:
+            config: agent configuration, cf. arg_parse
+            n_dialogues: number of dialogues
+            workers: number of worker processes; os.cpu_count() if None, in-process if 1
+            dialogue_file: annotated dialogue corpus of the simulated users
+            response_tempt: response templates
+            mode: ms, mb or ac
+            age_mode: qfra/qrfa_test/our
+            persona: persona of simulator
+            seed: seed of the population and of the dialogues
+            pacing: Pacing policy of the whole run; NoDelay if None. Every worker
+                process paces with its own copy, split with Pacing.share, e.g. a
+                TokenBucket's rate is divided by the number of workers
+
+        Returns: generator of dialogue records in order of completion; each record has
+            the index of its dialogue under "index", failed dialogues have an "error"
+
+        """
+        profiles = UserGenerator().population(n_dialogues, seed=seed)
+        seeds = np.random.SeedSequence(seed).generate_state(n_dialogues).tolist()
+        tasks = ((i, profile.preferences, seeds[i], age_mode, persona)
+                 for i, profile in enumerate(profiles))
+        if pacing is not None and workers != 1:
+            pacing = pacing.share(min(workers or os.cpu_count(), n_dialogues))
+        init_args = (config, dialogue_file, response_tempt, mode, pacing)
+        if workers == 1:
+            _init_worker(*init_args)
+            for task in tasks:
+                yield _run_worker_dialogue(*task)
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=init_args) as executor:
+            futures = [executor.submit(_run_worker_dialogue, *task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def init_agenda(user, age_mode="our"):
+    """Samples the agenda of a simulated user for a new dialogue.
+
+    Args:
+        user: simulated user
+        age_mode: qfra/qrfa_test/our
+
+    """
+    if age_mode == "qfra":
+        user.init_agenda_qrfa()
+    elif age_mode == "qrfa_test":
+        user.init_agenda_qrfa_test()
+    elif age_mode == "our":
+        user.init_agenda()
+    else:
+        raise TypeError("Set age mode 'qfra', 'qrfa_test', or 'our'")
+
+
+_WORKER = {}  # agent and conversation manager of a run_many worker process
+
+
+def _init_worker(config, dialogue_file, response_tempt, mode, pacing):
+    """Builds the agent and the simulated user of a run_many worker.
+
+    Args:
+        config: agent configuration
+        dialogue_file: annotated dialogue corpus
+        response_tempt: response templates
+        mode: ms, mb or ac
+        pacing: Pacing policy
+
+    """
+    _WORKER["agent"] = ConversationalSingleAgent(config)
+    _WORKER["agent"].initialize()
+    # Every dialogue resets the user with its own profile, so the worker starts from
+    # an empty placeholder instead of sampling one from the ratings
+    user = MovieSimulatedUser(dialogue_file, response_tempt, mode,
+                              user=SimulatedUser(persona={}, preferences=[{}, {}]))
+    _WORKER["manager"] = ConversationManager(user, Botbot(), pacing)
+
+
+def _run_worker_dialogue(index, preferences, seed, age_mode, persona):
+    """Runs one dialogue of run_many in a worker.
+
+    Args:
+        index: index of the dialogue
+        preferences: preferences of the simulated user
+        seed: seed of random for this dialogue
+        age_mode: qfra/qrfa_test/our
+        persona: persona of simulator
+
+    Returns: dialogue record; {"index": index, "error": message} if the dialogue failed
+
+    """
+    random.seed(seed)
+    manager = _WORKER["manager"]
+    manager._history = []
+    agent = _WORKER["agent"]
+    try:
+        manager._user.reset(SimulatedUser(persona={}, preferences=preferences))
+        agent.reset()
+        result = manager.run_dialogue(agent, age_mode=age_mode, persona=persona,
+                                      verbose=False)
+    except Exception as error:  # one failing dialogue must not stop the batch
+        result = {"error": "{}: {}".format(type(error).__name__, error)}
+    result["index"] = index
+    return result
+
 
 def arg_parse(args=None):
     """This function will parse the configuration file that was provided as a
@@ -204,6 +348,11 @@ if __name__ == "__main__":
         dialogues = args['dialogues']
         interaction_mode = args['interaction_mode']
         conv_man.run_single_agent(cfg_parser)
+    elif mode == "batch":
+        args = arg_parse(['', '-config', os.path.join(
+            os.path.abspath("."), "simulation/bot/jmrs1/config/movies_text.yaml")])
+        hist = sorted(ConversationManager.run_many(args['cfg_parser'], n_dialogues=8, seed=0),
+                      key=lambda res: res["index"])
     else:
         hist = []
         # change here to use a simulated user
@@ -0,0 +1,101 @@
+"""
+Pacing policies
+===============
+
+A pacing policy decides how long the conversation manager waits before the user
+replies to a system turn:
+
+    - NoDelay: no waiting, for simulations against in-process agents;
+    - FixedDelay: a fixed pause per turn;
+    - TokenBucket: at most `rate` turns per second on average, with bursts of up to
+      `capacity` turns, for agents that are remote services.
+
+Policies report the time they waited, so the time spent pacing can be told apart from
+the time spent computing turns. A policy used by several worker processes is split
+between them with `share`, since every process gets its own copy.
+"""
+
+import time
+from abc import ABC, abstractmethod
+
+
+class Pacing(ABC):
+    """Pacing policy"""
+
+    @abstractmethod
+    def wait(self):
+        """Waits before the next turn.
+
+        Returns: seconds waited
+
+        """
+        pass
+
+    def share(self, n_workers):
+        """Returns the policy of one of n_workers processes pacing together.
+
+        Args:
+            n_workers: number of worker processes
+
+        Returns: Pacing; the policy itself for per-turn policies
+
+        """
+        return self
+
+
+class NoDelay(Pacing):
+    """Does not wait."""
+
+    def wait(self):
+        return 0.0
+
+
+class FixedDelay(Pacing):
+    """Waits a fixed time per turn."""
+
+    def __init__(self, delay=1.0):
+        """
+        Args:
+            delay: seconds per turn
+        """
+        self.delay = delay
+
+    def wait(self):
+        start = time.monotonic()
+        time.sleep(self.delay)
+        return time.monotonic() - start
+
+
+class TokenBucket(Pacing):
+    """Rate limiter: a turn takes a token; tokens are refilled at a fixed rate."""
+
+    def __init__(self, rate=1.0, capacity=1):
+        """
+        Args:
+            rate: tokens per second
+            capacity: maximum number of tokens, i.e. the largest burst of turns
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def share(self, n_workers):
+        """Splits the rate and the burst evenly between n_workers processes, so that
+        together they stay within the rate. Each worker keeps a burst of at least one
+        turn."""
+        return TokenBucket(self.rate / n_workers, max(1, self.capacity / n_workers))
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait(self):
+        start = time.monotonic()
+        self._refill()
+        if self._tokens < 1:
+            time.sleep((1 - self._tokens) / self.rate)
+            self._refill()
+        self._tokens -= 1
+        return time.monotonic() - start
@@ -0,0 +1,99 @@
+"""
+Aho-Corasick matcher
+====================
+
+Finds which of a fixed set of strings occur as substrings of a text, in one pass over
+the text. The strings are compiled once into a trie with failure links (the
+Aho-Corasick automaton), so the cost of a search depends on the length of the text and
+the number of occurrences, not on the number of strings.
+"""
+
+from collections import deque
+
+
+class AhoCorasick:
+    """Multi-string substring matcher"""
+
+    def __init__(self, patterns):
+        """Builds the automaton.
+
+        Args:
+            patterns: strings; the i-th string is reported as i. The empty string occurs
+                in every text.
+        """
+        self._goto = [{}]  # {character: node} per node; node 0 is the root
+        self._outputs = [[]]  # ids of the patterns ending at each node
+        self._empty = []  # ids of empty patterns
+        for pattern_id, pattern in enumerate(patterns):
+            if not pattern:
+                self._empty.append(pattern_id)
+                continue
+            node = 0
+            for char in pattern:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = self._goto[node][char] = len(self._goto)
+                    self._goto.append({})
+                    self._outputs.append([])
+                node = child
+            self._outputs[node].append(pattern_id)
+
+        # Breadth-first, so the failure node of a node is final before the node's
+        # children are visited; outputs are merged along failure links.
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0) \
+                    if node else 0
+                self._outputs[child] = self._outputs[child] + \
+                    self._outputs[self._fail[child]]
+                queue.append(child)
+
+    def find(self, text):
+        """Finds the patterns occurring in a text.
+
+        Args:
+            text: text
+
+        Returns: set of pattern ids
+
+        """
+        found = set(self._empty)
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if outputs[node]:
+                found.update(outputs[node])
+        return found
+
+
+if __name__ == "__main__":
+    import json
+    import timeit
+    import yaml
+    from simulation.bot.jmrs1.Domain.DataBase import SQLDataBase
+    from simulation.bot.jmrs1.Domain.Ontology import Ontology
+    from simulation.bot.jmrs1.NLU.MovieNLU import MovieNLU
+
+    with open("simulation/bot/jmrs1/config/movies_text.yaml") as config_file:
+        CONFIG = yaml.load(config_file, Loader=yaml.Loader)["DIALOGUE"]
+    NLU = MovieNLU({"ontology": Ontology(CONFIG["ontology_path"]),
+                    "database": SQLDataBase(CONFIG["db_path"])})
+    with open("data/1224_ms.json") as dialogue_file:
+        UTTERANCES = [utterance[1].lower() for dialogue in json.load(dialogue_file).values()
+                      for utterance in dialogue if utterance[0] == "user"]
+    for slots in (["genres"], list(NLU.slot_values)):
+        values = [str(value).lower() for slot in slots for value in NLU.slot_values[slot]]
+        matcher = AhoCorasick(values)
+        automaton = timeit.timeit(lambda: [matcher.find(u) for u in UTTERANCES], number=1)
+        scan = timeit.timeit(lambda: [[v in u for v in values] for u in UTTERANCES], number=1)
+        print("{:6d} values: automaton {:.1f} us, scan {:.1f} us per utterance".format(
+            len(values), automaton / len(UTTERANCES) * 1e6, scan / len(UTTERANCES) * 1e6))
@@ -5,12 +5,12 @@ Simple NLU for the movie domain
 Author: Shuo Zhang, Krisztian Balog
 """
 
-import re
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from nltk.tokenize import word_tokenize
+from simulation.cache import LRUCache
 from simulation.nlp.movies import REPLACE_BY_SPACE_RE, BAD_SYMBOLS_RE, UTTERANCE_PATTERN
+from simulation.nlp.movies.pattern_matcher import PATTERN_MATCHER
+from simulation.nlp.movies.title_index import TitleIndex
+from simulation.nlp.movies.title_linker import TitleLinker
 from simulation.nlp.nlu import NLU
 
 PRE_FILE = "data/metadata_prep.csv"
@@ -19,25 +19,22 @@ PRE_FILE = "data/metadata_prep.csv"
 class MoviesNLU(NLU):
     """Movies NLU"""
 
-    def __init__(self):
+    def __init__(self, cache_size=1024):
         super(NLU, self).__init__()
-        self.metadata, self.titles_all, self.tfidf_fit_nlu, \
-        self.tfidf_matrix_nlu = self.naive_index()
+        self.title_index = self.naive_index()
+        self.linker = TitleLinker(self.title_index, self.text_prepare)
+        self.entity_cache = LRUCache(cache_size)  # {parsed utterance: linked movies}
 
     def naive_index(self):
         """Loads MovieLens dataset as local index.
 
-        Returns: movie lens indexes
+        The index is built once per version of PRE_FILE and memory mapped afterwards,
+        cf. TitleIndex.
+
+        Returns: movie lens title index
 
         """
-        metadata = pd.read_csv(PRE_FILE)  # cf. user/ml-20m/data_pre for data preparation
-        titles = metadata['title'].tolist()
-        docs = [self.text_prepare(title) for title in titles if isinstance(title, str)]
-        titles_all = [title for title in titles if isinstance(title, str)]
-        tfidf_vectorizer = TfidfVectorizer()
-        tfidf_fit = tfidf_vectorizer.fit(docs)
-        tfidf_matrix = tfidf_fit.transform(docs)
-        return metadata, titles_all, tfidf_fit, tfidf_matrix
+        return TitleIndex.load(PRE_FILE, self.text_prepare)
 
     @staticmethod
     def text_prepare(doc):
@@ -72,23 +69,18 @@ class MoviesNLU(NLU):
 
     @staticmethod
     def find_pattern(utterance):
-        """Finds the pattern by checking the prefix, i.e., checking the terms by splitting.
+        """Finds the utterance pattern, cf. PATTERN_MATCHER.
 
         Args:
             utterance: agent utterrance
 
-        Returns: pattern
+        Returns: pattern, or None if the utterance follows no known pattern
 
         """
-        prefix_list = UTTERANCE_PATTERN
-        for i in range(len(utterance.split())):
-            # Extend prefix by pointing the next term, and keep utterances having the same prefix
-            current_prefix_list = [j for j in prefix_list if utterance.split()[i] == j.split()[i]]
-            prefix_list = current_prefix_list
-            if len(prefix_list) == 1:
-                return UTTERANCE_PATTERN.get(prefix_list[0])
-        print("AGENT: ", utterance)
-        raise SyntaxError("Pattern not found!")
+        pattern_id, _ = PATTERN_MATCHER.match(utterance)
+        if pattern_id is None:
+            return None
+        return UTTERANCE_PATTERN.get(PATTERN_MATCHER.templates[pattern_id])
 
     def link_entity(self, sf, id=None):
         """Links entity for the given surface form.
@@ -100,22 +92,41 @@ class MoviesNLU(NLU):
         Returns: linked movies
 
         """
-        a = list(cosine_similarity(self.tfidf_fit_nlu.transform([self.text_prepare(sf)]),
-                                   self.tfidf_matrix_nlu.tocsr())[0])
-        b = sorted(range(len(a)), key=lambda i: a[i], reverse=True)[:1][0]
-        return self.titles_all[b] if not id else b  # return title or id
+        b = self.linker.link(sf)
+        return self.linker.title(b) if not id else b  # return title or id
 
     def link_entities(self, text):
         """Links entities in the given text.
 
+        The links are cached by parsed text, cf. parse, which is all they depend on.
+
         Args:
             text: text
 
-        Returns: linked movies
+        Returns: linked movies as (text, surface form, title, genres, title id) tuples
+
+        """
+        parsed = self.parse(text)
+        links = self.entity_cache.get_or_compute(parsed,
+                                                 lambda: self._link_entities(parsed))
+        return [(text, sf, title, list(genres), title_id)
+                for sf, title, genres, title_id in links]
+
+    def _link_entities(self, parsed):
+        """Links entities in a parsed text, bypassing the cache.
+
+        Args:
+            parsed: parsed text
+
+        Returns: linked movies as (surface form, title, genres, title id) tuples
 
         """
-        sfs = self.extract_sf(self.parse(text))
-        return [(text, sf, self.link_entity(sf), self.movie_genre(sf)) for sf in sfs]
+        sfs = self.extract_sf(parsed)
+        # All surface forms of the utterance are scored in one batch
+        linked = self.linker.top_k_batch(sfs, k=1)
+        return [(sf, self.linker.title(candidates[0][0]),
+                 tuple(self.movie_genre(sf, title_id=candidates[0][0])), candidates[0][0])
+                for sf, candidates in zip(sfs, linked)]
 
     def extract_sf(self, text):
         """Based on the recorded utterance patterns (cf. UTTERANCE_PATTERN),
@@ -124,25 +135,23 @@ class MoviesNLU(NLU):
         Args:
             text: text
 
-        Returns: surface form
+        Returns: list of surface forms, empty if the text follows no known pattern
 
         """
-        pattern = self.find_pattern(utterance=text)
-        p = re.compile(pattern).findall(text)
-        return p if isinstance(p[0], str) else list(p[0])
+        _, sfs = PATTERN_MATCHER.match(text)
+        return sfs
 
-    def movie_genre(self, title):
+    def movie_genre(self, title, title_id=None):
         """Finds movie genre based on movie title.
 
         Args:
             title: movie title
+            title_id: id of the linked title, used if the title has no exact match
 
         Returns: list of movie genre
 
         """
-        try:
-            res = str(self.metadata[self.metadata['title'] == title]
-                      ['genres'].values[0]).split(", ")
-        except Exception:
-            res = []
-        return res
+        exact_id = self.title_index.exact_id(title)
+        if exact_id is not None:
+            title_id = exact_id
+        return list(self.title_index.genres(title_id)) if title_id is not None else []
@@ -0,0 +1,75 @@
+"""
+Utterance pattern matcher
+=========================
+
+Detects which agent utterance pattern (cf. UTTERANCE_PATTERN) an utterance follows and
+captures the movie surface forms in one pass. All patterns are compiled at import time
+into a single alternation, where each pattern is wrapped in a named group.
+
+Run ``python -m simulation.nlp.movies.pattern_matcher`` for a micro-benchmark over the
+agent utterances of an annotated dialogue corpus.
+"""
+
+import re
+from simulation.nlp.movies import UTTERANCE_PATTERN
+
+
+class UtterancePatternMatcher:
+    """Combined regex matcher over utterance patterns"""
+
+    def __init__(self, patterns):
+        """Compiles the patterns into one alternation.
+
+        At every position of the utterance the alternatives are tried in order, so the
+        pattern that starts earliest wins; e.g. "Thank you for your feedback. There is a
+        movie named ..." is not mistaken for "There is a movie named ...".
+
+        Args:
+            patterns: {utterance template: regex with one group per surface form}
+        """
+        self.templates = list(patterns)
+        self._groups = []  # [(first inner group, number of inner groups)]
+        alternatives = []
+        group = 1
+        for i, template in enumerate(self.templates):
+            regex = patterns[template]
+            num_groups = re.compile(regex).groups
+            alternatives.append("(?P<p{}>{})".format(i, regex))
+            self._groups.append((group + 1, num_groups))
+            group += num_groups + 1
+        self._regex = re.compile("|".join(alternatives))
+
+    def match(self, utterance):
+        """Finds the pattern of an utterance and captures its surface forms.
+
+        Args:
+            utterance: agent utterance
+
+        Returns: (pattern id, list of surface forms); (None, []) if no pattern matches
+
+        """
+        match = self._regex.search(utterance)
+        if not match:
+            return None, []
+        pattern_id = int(match.lastgroup[1:])
+        first, num_groups = self._groups[pattern_id]
+        return pattern_id, list(match.group(*range(first, first + num_groups))) \
+            if num_groups > 1 else [match.group(first)]
+
+
+PATTERN_MATCHER = UtterancePatternMatcher(UTTERANCE_PATTERN)
+
+
+if __name__ == "__main__":
+    import json
+    import timeit
+
+    with open("data/1224_ms.json") as dialogue_file:
+        UTTERANCES = [utterance[1] for dialogue in json.load(dialogue_file).values()
+                      for utterance in dialogue if utterance[0] == "agent"]
+    NUMBER = 20
+    SECONDS = timeit.timeit(lambda: [PATTERN_MATCHER.match(u) for u in UTTERANCES],
+                            number=NUMBER)
+    print("{} utterances, {} matched, {:.2f} us per utterance".format(
+        len(UTTERANCES), sum(PATTERN_MATCHER.match(u)[0] is not None for u in UTTERANCES),
+        SECONDS / NUMBER / len(UTTERANCES) * 1e6))
@@ -0,0 +1,237 @@
+"""
+Persisted title index for the movie domain
+==========================================
+
+The TF-IDF index over movie titles is built once per source file and saved as plain
+``.npy`` arrays (vocabulary, IDF vector, CSR matrix and titles). The arrays are opened
+with memory mapping, so creating a simulated user does not refit the vectorizer and
+worker processes share the same pages.
+
+Next to the TF-IDF matrix, the artifact holds an inverted index from character
+trigrams to title ids. It is used to generate a small set of candidate titles for a
+surface form, so only those need to be scored. The genres of each title are stored
+as well, so that genre lookups do not need the metadata data frame.
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+from simulation.cache import file_hash, cache_path
+
+VERSION = 3  # bump when the artifact layout changes
+
+_LOADED = {}  # {source digest: TitleIndex}, shared by all users of a process
+
+
+def normalise_title(title):
+    """Normalises a title for exact matching (case and whitespace).
+
+    Args:
+        title: title or surface form
+
+    Returns: normalised title
+
+    """
+    return " ".join(title.lower().split())
+
+
+def trigrams(doc):
+    """Returns the character trigrams of a (preprocessed) document.
+
+    Args:
+        doc: text
+
+    Returns: set of trigrams
+
+    """
+    doc = " " + doc + " "
+    return {doc[i:i + 3] for i in range(len(doc) - 2)}
+
+
+def _save_strings(path, name, strings):
+    """Saves strings as one UTF-8 blob plus offsets, both memory mappable.
+
+    Args:
+        path: index directory
+        name: array name
+        strings: list of strings
+
+    """
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in encoded])
+    np.save(os.path.join(path, name + ".npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, name + "_offsets.npy"), offsets)
+
+
+class StringTable:
+    """Read-only sequence of strings backed by a memory mapped UTF-8 blob."""
+
+    def __init__(self, path, name):
+        self._blob = np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        self._offsets = np.load(os.path.join(path, name + "_offsets.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        blob = bytes(self._blob)
+        offsets = self._offsets.tolist()
+        return (blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:]))
+
+
+class TitleIndex:
+    """TF-IDF index over movie titles, loaded from its on-disk artifact."""
+
+    def __init__(self, path):
+        self.path = path
+        self.titles = StringTable(path, "titles")
+        vocabulary = list(StringTable(path, "vocabulary"))
+        idf = np.load(os.path.join(path, "idf.npy"), mmap_mode="r")
+        self.tfidf_fit = TfidfVectorizer(vocabulary={t: i for i, t in enumerate(vocabulary)})
+        self.tfidf_fit.idf_ = idf
+        self.tfidf_matrix = csr_matrix(
+            tuple(np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+                  for name in ["data", "indices", "indptr"]),
+            shape=(len(self.titles), len(vocabulary)), copy=False)
+        self.trigram_vocabulary = {t: i for i, t in enumerate(StringTable(path, "trigrams"))}
+        # Postings of trigram i are postings[postings_indptr[i]:postings_indptr[i + 1]]
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.postings_indptr = np.load(os.path.join(path, "postings_indptr.npy"), mmap_mode="r")
+        self._exact_ids = None
+        self._genres = None
+
+    def genres(self, title_id):
+        """Returns the genres of a title.
+
+        Genre tuples are interned, i.e. titles with the same genres share one tuple.
+
+        Args:
+            title_id: title id
+
+        Returns: tuple of genres
+
+        """
+        if self._genres is None:
+            interned = {}
+            self._genres = [interned.setdefault(genres, tuple(genres.split(", ")) if genres
+                                                else ())
+                            for genres in StringTable(self.path, "genres")]
+        return self._genres[title_id]
+
+    def exact_id(self, sf):
+        """Looks up a title that matches the surface form verbatim (up to case and spacing).
+
+        Args:
+            sf: surface form
+
+        Returns: title id, or None
+
+        """
+        if self._exact_ids is None:
+            self._exact_ids = {}
+            for i, title in enumerate(self.titles):
+                self._exact_ids.setdefault(normalise_title(title), i)
+        return self._exact_ids.get(normalise_title(sf))
+
+    def candidates(self, doc, max_candidates=500, max_postings=20000):
+        """Generates candidate titles that share character trigrams with a document.
+
+        Posting lists are visited from the rarest trigram to the most frequent one until
+        max_postings title ids are gathered, which bounds the cost per call regardless of
+        the catalogue size. Candidates are ranked by the number of shared trigrams.
+
+        Args:
+            doc: preprocessed surface form (cf. MoviesNLU.text_prepare)
+            max_candidates: maximum number of candidates
+            max_postings: budget of title ids read from posting lists
+
+        Returns: sorted array of title ids
+
+        """
+        gram_ids = np.array([self.trigram_vocabulary[gram] for gram in trigrams(doc)
+                             if gram in self.trigram_vocabulary], dtype=np.int64)
+        if not len(gram_ids):
+            return np.empty(0, dtype=np.int64)
+        starts = self.postings_indptr[gram_ids]
+        ends = self.postings_indptr[gram_ids + 1]
+        postings, total = [], 0
+        for j in np.argsort(ends - starts, kind="stable"):
+            if postings and total + ends[j] - starts[j] > max_postings:
+                break
+            postings.append(self.postings[starts[j]:ends[j]])
+            total += ends[j] - starts[j]
+        ids, counts = np.unique(np.concatenate(postings), return_counts=True)
+        if len(ids) > max_candidates:
+            ids = np.sort(ids[np.argpartition(-counts, max_candidates - 1)[:max_candidates]])
+        return ids.astype(np.int64)
+
+    @staticmethod
+    def build(source_file, path, text_prepare):
+        """Builds the index artifact for the given metadata file.
+
+        The artifact is written to a temporary directory first and then moved into
+        place, so concurrent builders never expose a partial index.
+
+        Args:
+            source_file: movie metadata (cf. data/data_pre.py)
+            path: target directory
+            text_prepare: title preprocessing function
+
+        """
+        metadata = pd.read_csv(source_file, usecols=["title", "genres"])
+        metadata = metadata[metadata["title"].map(lambda title: isinstance(title, str))]
+        titles = metadata["title"].tolist()
+        genres = [g if isinstance(g, str) else "" for g in metadata["genres"].tolist()]
+        docs = [text_prepare(title) for title in titles]
+        tfidf_fit = TfidfVectorizer().fit(docs)
+        tfidf_matrix = tfidf_fit.transform(docs).tocsr()
+        grams, rows, cols = {}, [], []
+        for i, doc in enumerate(docs):
+            for gram in trigrams(doc):
+                rows.append(grams.setdefault(gram, len(grams)))
+                cols.append(i)
+        postings = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                              shape=(len(grams), len(docs)))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path))
+        _save_strings(tmp_path, "titles", titles)
+        _save_strings(tmp_path, "genres", genres)
+        _save_strings(tmp_path, "vocabulary", tfidf_fit.get_feature_names_out())
+        np.save(os.path.join(tmp_path, "idf.npy"), tfidf_fit.idf_)
+        for name in ["data", "indices", "indptr"]:
+            np.save(os.path.join(tmp_path, name + ".npy"), getattr(tfidf_matrix, name))
+        _save_strings(tmp_path, "trigrams", list(grams))
+        np.save(os.path.join(tmp_path, "postings.npy"), postings.indices)
+        np.save(os.path.join(tmp_path, "postings_indptr.npy"), postings.indptr)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:  # built concurrently by another process
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, source_file, text_prepare):
+        """Loads the index for the given metadata file, building it if necessary.
+
+        Args:
+            source_file: movie metadata (cf. data/data_pre.py)
+            text_prepare: title preprocessing function, used only when building
+
+        Returns: title index
+
+        """
+        digest = file_hash(source_file)
+        if digest not in _LOADED:
+            path = cache_path("title_index", "{}-v{}".format(digest, VERSION))
+            if not os.path.isdir(path):
+                cls.build(source_file, path, text_prepare)
+            _LOADED[digest] = cls(path)
+        return _LOADED[digest]
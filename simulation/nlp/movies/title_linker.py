@@ -0,0 +1,118 @@
+"""
+Movie title linker
+==================
+
+Links surface forms to movie titles of a TitleIndex by TF-IDF cosine similarity.
+Several surface forms, e.g. all options of a recommendation list, are linked with one
+sparse matrix product.
+
+Titles copied verbatim by the agent are resolved by an exact-match lookup. Otherwise,
+candidates are generated from the trigram index and only those are re-ranked; the
+full catalogue is scanned only when no candidate shares a term with the surface form.
+"""
+
+import numpy as np
+from simulation.nlp.nearest_neighbours import SparseNearestNeighbours, top_k_row
+
+
+class TitleLinker:
+    """Top-k title linker"""
+
+    def __init__(self, title_index, text_prepare, max_candidates=500):
+        """Wraps a title index; TF-IDF rows are stored L2-normalised already.
+
+        Args:
+            title_index: TitleIndex
+            text_prepare: function applied to surface forms before vectorising
+            max_candidates: number of trigram candidates re-ranked per surface form
+        """
+        self.title_index = title_index
+        self.text_prepare = text_prepare
+        self.max_candidates = max_candidates
+        self.neighbours = SparseNearestNeighbours(title_index.tfidf_matrix, normalised=True)
+
+    def title(self, title_id):
+        """Returns the title with the given id.
+
+        Args:
+            title_id: title id
+
+        Returns: movie title
+
+        """
+        return self.title_index.titles[title_id]
+
+    def top_k_batch(self, sfs, k=1):
+        """Finds the k best matching titles for each surface form.
+
+        Args:
+            sfs: list of surface forms
+            k: number of candidates
+
+        Returns: list of [(title_id, score)], one list per surface form, best first
+
+        """
+        exact = [self.title_index.exact_id(sf) for sf in sfs]
+        results = [[(title_id, 1.0)] if title_id is not None else [] for title_id in exact]
+        todo = [i for i, title_id in enumerate(exact) if title_id is None or k > 1]
+        if not todo:
+            return results
+        docs = [self.text_prepare(sfs[i]) for i in todo]
+        queries = self.title_index.tfidf_fit.transform(docs)
+        candidates = [self.title_index.candidates(doc, self.max_candidates) for doc in docs]
+
+        # Re-rank the candidates of all surface forms with one sparse product
+        rows = np.unique(np.concatenate(candidates))
+        scores = self.neighbours.scores(queries, rows)
+        full_scan = []
+        for j, i in enumerate(todo):
+            ids, top = top_k_row(scores[j, np.searchsorted(rows, candidates[j])], k + 1)
+            if not len(top) or top[0] <= 0:
+                full_scan.append(j)
+                continue
+            results[i] = self._merge(results[i], candidates[j][ids], top, k)
+        if full_scan:
+            for j, (ids, top) in zip(full_scan, self.neighbours.top_k(queries[full_scan], k + 1)):
+                results[todo[j]] = self._merge(results[todo[j]], ids, top, k)
+        return results
+
+    @staticmethod
+    def _merge(exact, ids, scores, k):
+        """Appends ranked candidates to an exact match, if any, up to k entries.
+
+        Args:
+            exact: [] or [(title_id, 1.0)]
+            ids: candidate title ids, best first
+            scores: candidate scores
+            k: number of entries
+
+        Returns: [(title_id, score)]
+
+        """
+        seen = {title_id for title_id, _ in exact}
+        ranked = [(title_id, score) for title_id, score in zip(ids.tolist(), scores.tolist())
+                  if title_id not in seen]
+        return (exact + ranked)[:k]
+
+    def top_k(self, sf, k=1):
+        """Finds the k best matching titles for a surface form.
+
+        Args:
+            sf: surface form
+            k: number of candidates
+
+        Returns: [(title_id, score)], best first
+
+        """
+        return self.top_k_batch([sf], k)[0]
+
+    def link(self, sf):
+        """Links a surface form to the id of its best matching title.
+
+        Args:
+            sf: surface form
+
+        Returns: title id
+
+        """
+        return self.top_k(sf)[0][0]
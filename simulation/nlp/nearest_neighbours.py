@@ -0,0 +1,80 @@
+"""
+Sparse nearest neighbours
+=========================
+
+Top-k cosine similarity search over L2-normalised sparse rows (e.g. TF-IDF vectors).
+All queries of a batch are scored with a single sparse matrix product; the top-k
+selection uses ``argpartition`` instead of sorting every row.
+"""
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+
+class SparseNearestNeighbours:
+    """Cosine nearest neighbour search over the rows of a sparse matrix."""
+
+    def __init__(self, matrix, normalised=False):
+        """Normalises the rows once, so that scoring is a plain sparse product.
+
+        Args:
+            matrix: sparse (n_items, n_features) matrix
+            normalised: whether rows are already L2-normalised (skips the copy)
+        """
+        self.matrix = matrix.tocsr() if normalised else normalize(matrix.tocsr())
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores(self, queries, rows=None):
+        """Scores queries against all rows, or against a subset of them.
+
+        Args:
+            queries: sparse (n_queries, n_features) matrix
+            rows: optional array of row ids to score
+
+        Returns: dense (n_queries, n_items) array of cosine similarities, columns
+            following rows if given
+
+        """
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        return (matrix @ normalize(queries).T).toarray().T
+
+    def top_k(self, queries, k=1):
+        """Finds the k most similar rows for each query.
+
+        Ties are broken by row id, so that ``k=1`` returns the first row with the
+        highest score.
+
+        Args:
+            queries: sparse (n_queries, n_features) matrix
+            k: number of neighbours
+
+        Returns: list of (ids, scores) array pairs, one per query, best first
+
+        """
+        return [top_k_row(row, k) for row in self.scores(queries)]
+
+
+def top_k_row(row, k):
+    """Selects the k highest scores of a row in O(n).
+
+    Args:
+        row: 1-d array of scores
+        k: number of items
+
+    Returns: (ids, scores), sorted by descending score and then by id
+
+    """
+    k = min(k, len(row))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=row.dtype)
+    if k == 1:
+        ids = np.array([np.argmax(row)])
+    else:
+        kth = row[np.argpartition(-row, k - 1)[k - 1]]
+        above = np.flatnonzero(row > kth)
+        ties = np.flatnonzero(row == kth)[:k - len(above)]
+        ids = np.concatenate([above, ties])
+        ids = ids[np.lexsort((ids, -row[ids]))]
+    return ids, row[ids]
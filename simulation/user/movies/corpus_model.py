@@ -0,0 +1,226 @@
+"""
+Dialogue corpus model
+=====================
+
+Transition statistics and the agent intent index derived from an annotated dialogue
+corpus (e.g. data/1224_ms.json). The model is read-only once built and is shared by all
+simulated users of a process, so creating a user does not re-parse the corpus.
+
+Models are cached in-process and pickled under ``CACHE_DIR``, keyed by a hash of the
+corpus file, cf. simulation.cache.
+"""
+
+import os
+import json
+import pickle
+import tempfile
+from simulation.cache import file_hash, cache_path
+from simulation.user.movies import USER_TAG, AGENT_TAG, QUERY, REQUEST, count
+from simulation.user.movies.intent_index import IntentIndex
+from simulation.user.transitions import TransitionTable, AgendaSampler
+
+VERSION = 3  # bump when the pickled layout changes
+
+_LOADED = {}  # {corpus digest: CorpusModel}, shared by all users of a process
+
+
+def _transitions(sequences):
+    """Counts the transitions between consecutive items; the last item moves to "Stop".
+
+    Args:
+        sequences: list of item sequences
+
+    Returns: {item: {next item: occurrence}}
+
+    """
+    stat = {}
+    for sequence in sequences:
+        for i, item in enumerate(sequence):
+            act = sequence[i + 1] if i < len(sequence) - 1 else "Stop"
+            stat.setdefault(item, {}).setdefault(act, 0)
+            stat[item][act] += 1
+    return stat
+
+
+def qrfa_check(item):
+    """Checks QRFA intent.
+
+    Args:
+        item: item
+
+    Returns: system intent
+
+    """
+    if item[0] == USER_TAG:
+        label = item[2]
+    elif item[0] == AGENT_TAG:
+        label = "REQUEST" if item[2] in REQUEST else "ANSWER"
+    else:
+        label = "MISSING"
+    return label
+
+
+def state_map(agenda):
+    """Builds the state map based on agenda.
+
+    Args:
+        agenda: agenda
+
+    Returns: agenda map
+
+    """
+    agenda_map = []
+    for item in agenda:
+        if item[0] == USER_TAG:
+            label = "QUERY" if item[2] in QUERY else "FEEDBACK"
+        elif item[0] == AGENT_TAG:
+            label = "REQUEST" if item[2] in REQUEST else "ANSWER"
+        else:
+            label = "MISSING"
+        agenda_map.append(label)
+    agenda_map = ["START"] + agenda_map + ["STOP"]
+    return agenda_map
+
+
+def rank_qrfa_agendas(diags, top_n=10):
+    """Ranks the dialogues by the mean QRFA transition count of their states.
+
+    Args:
+        diags: {dialogue id: [[tag, utterance, intent]]}
+        top_n: number of agendas
+
+    Returns: list of user agendas of the top_n dialogues with more than three user turns
+
+    """
+    scores = {}
+    for k, intent in diags.items():
+        agenda = state_map(intent)
+        tmp = []
+        for i in range(1, len(agenda) - 2):
+            tmp.append(count.get(agenda[i]).get(agenda[i + 1]))
+        scores[k] = sum(tmp) / len(tmp)
+    top_list = [j[0] for j in sorted(scores.items(), key=lambda kv: kv[1], reverse=True) if
+                len([n for n in diags[j[0]] if n[0] == USER_TAG]) > 3][:top_n]
+    return [[m[2] for m in diags.get(item) if m[0] == USER_TAG] for item in top_list]
+
+
+class CorpusModel:
+    """Read-only statistics of an annotated dialogue corpus.
+
+    Attributes:
+        diags: {dialogue id: [[tag, utterance, intent]]}
+        agenda_list: [[user intents of a dialogue]]
+        agenda_stat: {user_intent: {next_user_intent: occurrence}}
+        agenda_stat_qrfa: {QRFA label: {next QRFA label: occurrence}}
+        agent_user_intent: {agent_intent: {user_intent: occurrence}}
+        intent_map: {agent utterance: intent annotation}
+        intent_index: IntentIndex over intent_map
+        qrfa_agendas: tuple of the top ranked user agendas for QRFA, cf.
+            rank_qrfa_agendas; agendas are tuples, so they cannot be altered by users
+        agenda_table, agenda_table_qrfa, agent_user_table: compiled TransitionTables of
+            agenda_stat, agenda_stat_qrfa and agent_user_intent
+    """
+
+    def __init__(self, diags):
+        """Computes the statistics of a parsed corpus.
+
+        Args:
+            diags: {dialogue id: [[tag, utterance, intent]]}
+        """
+        self.diags = diags
+        self.agenda_list = [[i[2] for i in diag if i[0] == USER_TAG]
+                            for diag in diags.values()]
+        self.agenda_stat = _transitions(self.agenda_list)
+        self.agenda_stat_qrfa = _transitions([[qrfa_check(i) for i in diag]
+                                              for diag in diags.values()])
+        self.agent_user_intent = {}
+        for diag in diags.values():
+            for first, second in zip(diag, diag[1:]):
+                if first[0] == AGENT_TAG:
+                    stat = self.agent_user_intent.setdefault(first[2], {})
+                    stat[second[2]] = stat.get(second[2], 0) + 1
+        self.intent_map = {}
+        for diag in diags.values():
+            for item in diag:
+                if item[0] == AGENT_TAG:
+                    self.intent_map[item[1]] = item[2]
+        self.intent_index = IntentIndex(self.intent_map)
+        self.qrfa_agendas = tuple(tuple(agenda) for agenda in rank_qrfa_agendas(diags))
+        self.agenda_table = TransitionTable(self.agenda_stat)
+        self.agenda_table_qrfa = TransitionTable(self.agenda_stat_qrfa)
+        self.agent_user_table = TransitionTable(self.agent_user_intent)
+        self._agenda_sampler = None
+
+    @property
+    def agenda_sampler(self):
+        """Sampler of user agendas that start with "Non-disclose", have "Disclose"
+        among their first five intents and at most 12 intents.
+
+        Returns: AgendaSampler over agenda_table
+
+        """
+        if self._agenda_sampler is None:
+            self._agenda_sampler = AgendaSampler(self.agenda_table, start="Non-disclose",
+                                                 required="Disclose", within=5, max_len=12)
+        return self._agenda_sampler
+
+    @classmethod
+    def build(cls, dialogue_file):
+        """Parses a corpus file and computes its model, bypassing the caches.
+
+        Args:
+            dialogue_file: annotated dialogue corpus
+
+        Returns: corpus model
+
+        """
+        with open(dialogue_file) as source:
+            return cls(json.load(source))
+
+    def save(self, path):
+        """Pickles the model; the file is written atomically.
+
+        Args:
+            path: target file
+
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as target:
+            pickle.dump(self, target, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, dialogue_file):
+        """Loads the model of a corpus, building it if necessary.
+
+        Args:
+            dialogue_file: annotated dialogue corpus
+
+        Returns: corpus model, shared by all callers of the process
+
+        """
+        digest = file_hash(dialogue_file)
+        if digest not in _LOADED:
+            path = cache_path("corpus", "{}-v{}.pkl".format(digest, VERSION))
+            try:
+                with open(path, "rb") as source:
+                    model = pickle.load(source)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                model = cls.build(dialogue_file)
+                model.save(path)
+            _LOADED[digest] = model
+        return _LOADED[digest]
+
+
+if __name__ == "__main__":
+    import timeit
+
+    print("build: {:.3f} s".format(
+        timeit.timeit(lambda: CorpusModel.build("data/1224_ms.json"), number=1)))
+    CorpusModel.load("data/1224_ms.json")
+    _LOADED.clear()
+    print("load from disk: {:.3f} s".format(
+        timeit.timeit(lambda: CorpusModel.load("data/1224_ms.json"), number=1)))
+    print("load in-process: {:.6f} s".format(
+        timeit.timeit(lambda: CorpusModel.load("data/1224_ms.json"), number=1)))
@@ -0,0 +1,74 @@
+"""
+Agent intent index
+==================
+
+Annotates agent utterances with the intent of the most similar utterance of an
+annotated dialogue corpus. Utterances without an exact match are vectorised together
+and scored with one sparse product against the pre-normalised TF-IDF matrix.
+"""
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from simulation.nlp.nearest_neighbours import SparseNearestNeighbours
+
+
+class IntentIndex:
+    """Nearest-neighbour intent annotator"""
+
+    def __init__(self, intent_map):
+        """Fits TF-IDF over the annotated utterances.
+
+        Args:
+            intent_map: {agent utterance: intent} built from the corpus
+        """
+        self.intent_map = intent_map
+        docs = sorted(intent_map)
+        self.intents = np.array([intent_map[doc] for doc in docs], dtype=object)
+        self.tfidf_fit = TfidfVectorizer().fit(docs)
+        self.neighbours = SparseNearestNeighbours(self.tfidf_fit.transform(docs))
+
+    def lookup(self, utterance):
+        """Annotates an utterance by exact match or by the hand-written rules.
+
+        Args:
+            utterance: agent utterance
+
+        Returns: intent, or None if the utterance needs a similarity search
+
+        """
+        if utterance in self.intent_map:
+            return self.intent_map.get(utterance)
+        elif "The movie plot is about" in utterance:
+            return "Repeat"
+        elif "I didn't understand" in utterance or "Can you reword your statement?" in utterance:
+            return "Elicit"
+        return None
+
+    def annotate_batch(self, utterances):
+        """Annotates a list of agent utterances.
+
+        Args:
+            utterances: list of agent utterances
+
+        Returns: list of intents
+
+        """
+        intents = [self.lookup(utterance) for utterance in utterances]
+        todo = [i for i, intent in enumerate(intents) if intent is None]
+        if todo:
+            scores = self.neighbours.scores(
+                self.tfidf_fit.transform([utterances[i] for i in todo]))
+            for i, best in zip(todo, scores.argmax(axis=1)):
+                intents[i] = self.intents[best]
+        return intents
+
+    def annotate(self, utterance):
+        """Annotates an agent utterance.
+
+        Args:
+            utterance: agent utterance
+
+        Returns: intent
+
+        """
+        return self.annotate_batch([utterance])[0]
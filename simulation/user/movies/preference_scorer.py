@@ -0,0 +1,103 @@
+"""
+Movie preference scorer
+=======================
+
+Decides whether a simulated user likes a movie from the user's genre preferences. The
+score of a movie is the sum of the user's preferences (-1/0/1) over the genres of the
+movie; genres the user has no preference for count 0. The genres of all titles of a
+TitleIndex are one-hot encoded once, so scoring one movie or all options of a
+recommendation list is one sparse matrix-vector product.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+_LOADED = {}  # {title index path: PreferenceScorer}, shared by all users of a process
+
+
+class PreferenceScorer:
+    """Genre based like/dislike scorer"""
+
+    def __init__(self, title_index, threshold=0):
+        """One-hot encodes the genres of the titles.
+
+        Args:
+            title_index: TitleIndex
+            threshold: a movie is liked if its score is at least this number; or a
+                function mapping an array of scores to an array of booleans
+        """
+        self.threshold = threshold
+        genres, rows, cols = {}, [], []
+        for title_id in range(len(title_index.titles)):
+            for genre in title_index.genres(title_id):
+                rows.append(title_id)
+                cols.append(genres.setdefault(genre, len(genres)))
+        self.genres = list(genres)
+        self.movie_genres = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                                       shape=(len(title_index.titles), len(self.genres)))
+
+    def user_vector(self, profile):
+        """Returns the genre preferences of a user over the genres of the titles.
+
+        Args:
+            profile: UserProfile
+
+        Returns: int8 array
+
+        """
+        return np.array([profile.genre_preference(genre) for genre in self.genres],
+                        dtype=np.int8)
+
+    def scores(self, profile, title_ids):
+        """Scores a list of movies.
+
+        Args:
+            profile: UserProfile
+            title_ids: title ids
+
+        Returns: array of scores
+
+        """
+        return self.movie_genres[title_ids] @ self.user_vector(profile)
+
+    def likes(self, profile, title_ids):
+        """Decides for a list of movies whether the user likes them.
+
+        Args:
+            profile: UserProfile
+            title_ids: title ids
+
+        Returns: list of booleans
+
+        """
+        scores = self.scores(profile, title_ids)
+        if callable(self.threshold):
+            return np.asarray(self.threshold(scores), dtype=bool).tolist()
+        return (scores >= self.threshold).tolist()
+
+    def like(self, profile, title_id):
+        """Decides whether the user likes a movie.
+
+        Args:
+            profile: UserProfile
+            title_id: title id
+
+        Returns: bool
+
+        """
+        return self.likes(profile, [title_id])[0]
+
+    @classmethod
+    def load(cls, title_index):
+        """Returns the scorer of a title index with the default threshold, built once
+        per process.
+
+        Args:
+            title_index: TitleIndex
+
+        Returns: scorer
+
+        """
+        if title_index.path not in _LOADED:
+            _LOADED[title_index.path] = cls(title_index)
+        return _LOADED[title_index.path]
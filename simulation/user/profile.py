@@ -0,0 +1,246 @@
+"""
+Compact user profile
+====================
+
+Preferences of a simulated user, stored as small typed arrays over interned ids
+instead of dictionaries keyed by title and genre strings:
+
+    - rated movies (ids) with their ratings, in the order they were added;
+    - a fixed-width genre preference vector over GENRES, plus the ids of the genres
+      the user has a preference for, in order;
+    - the liked movies (rating 1) and liked genres (preference 1), kept up to date
+      when a movie is rated, so sampling one of them is a single index.
+
+Movie keys (titles or MovieLens ids) and genres are interned in process-wide
+vocabularies, so profiles only hold integers.
+"""
+
+import random
+from array import array
+
+
+class Vocabulary:
+    """Interns keys as consecutive integer ids."""
+
+    def __init__(self, keys=()):
+        self._ids = {}
+        self._keys = []
+        for key in keys:
+            self.id(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def id(self, key):
+        """Returns the id of a key, adding the key if it is new.
+
+        Args:
+            key: key
+
+        Returns: id
+
+        """
+        key_id = self._ids.get(key)
+        if key_id is None:
+            key_id = self._ids[key] = len(self._keys)
+            self._keys.append(key)
+        return key_id
+
+    def get(self, key):
+        """Returns the id of a key without adding it.
+
+        Args:
+            key: key
+
+        Returns: id, or None for an unknown key
+
+        """
+        return self._ids.get(key)
+
+    def key(self, key_id):
+        """Returns the key of an id.
+
+        Args:
+            key_id: id
+
+        Returns: key
+
+        """
+        return self._keys[key_id]
+
+
+MOVIES = Vocabulary()
+GENRES = Vocabulary()
+
+
+class UserProfile:
+    """Movie and genre preferences of a user."""
+
+    __slots__ = ["movie_ids", "ratings", "genre_ids", "genre_vector", "liked_movies",
+                 "liked_genres"]
+
+    def __init__(self):
+        self.movie_ids = array("i")
+        self.ratings = array("f")
+        self.genre_ids = array("B")
+        self.genre_vector = array("b", bytes(len(GENRES)))
+        self.liked_movies = array("i")
+        self.liked_genres = array("B")
+
+    @classmethod
+    def from_preferences(cls, preferences):
+        """Creates a profile from preferences in the dictionary format.
+
+        Args:
+            preferences: [{movie: rating}, {genre: preference}]
+
+        Returns: profile
+
+        """
+        profile = cls()
+        movies, genres = preferences
+        for genre in genres:
+            GENRES.id(genre)
+        profile.genre_vector = array("b", bytes(len(GENRES)))
+        for movie, rating in movies.items():
+            profile.rate(movie, rating)
+        for genre, preference in genres.items():
+            genre_id = GENRES.id(genre)
+            profile.genre_ids.append(genre_id)
+            profile.genre_vector[genre_id] = preference
+            if preference == 1:
+                profile.liked_genres.append(genre_id)
+        return profile
+
+    def to_preferences(self):
+        """Returns the preferences in the dictionary format.
+
+        Returns: [{movie: rating}, {genre: preference}]
+
+        """
+        return [{MOVIES.key(movie_id): int(rating) if rating == int(rating) else rating
+                 for movie_id, rating in zip(self.movie_ids, self.ratings)},
+                {GENRES.key(genre_id): self.genre_vector[genre_id]
+                 for genre_id in self.genre_ids}]
+
+    def _position(self, movie):
+        """Returns the position of a movie among the rated movies.
+
+        Args:
+            movie: movie title or id
+
+        Returns: position, or None if the movie is not rated
+
+        """
+        movie_id = MOVIES.get(movie)
+        if movie_id is None:
+            return None
+        try:
+            return self.movie_ids.index(movie_id)
+        except ValueError:
+            return None
+
+    def has_rated(self, movie):
+        """Tells whether the user has rated a movie.
+
+        Args:
+            movie: movie title or id
+
+        Returns: bool
+
+        """
+        return self._position(movie) is not None
+
+    def rating(self, movie):
+        """Returns the rating of a movie.
+
+        Args:
+            movie: movie title or id
+
+        Returns: rating, or None if the movie is not rated
+
+        """
+        position = self._position(movie)
+        return None if position is None else self.ratings[position]
+
+    def rate(self, movie, rating):
+        """Adds or updates the rating of a movie and the liked movies.
+
+        Args:
+            movie: movie title or id
+            rating: rating
+
+        """
+        movie_id = MOVIES.id(movie)
+        position = self._position(movie)
+        if position is None:
+            self.movie_ids.append(movie_id)
+            self.ratings.append(rating)
+        else:
+            if self.ratings[position] == 1:
+                self.liked_movies.remove(movie_id)
+            self.ratings[position] = rating
+        if rating == 1:
+            self.liked_movies.append(movie_id)
+
+    def genre_preference(self, genre):
+        """Returns the preference for a genre.
+
+        Args:
+            genre: genre
+
+        Returns: -1, 0 or 1; 0 for genres without a preference
+
+        """
+        genre_id = GENRES.get(genre)
+        return self.genre_vector[genre_id] \
+            if genre_id is not None and genre_id < len(self.genre_vector) else 0
+
+    def genre_score(self, genres):
+        """Sums the preferences for a list of genres.
+
+        Args:
+            genres: genres, e.g. of a movie
+
+        Returns: sum of genre preferences
+
+        """
+        return sum(self.genre_preference(genre) for genre in genres)
+
+    def sample_genre(self, liked=False):
+        """Draws a genre uniformly with random.randint.
+
+        Only genres of the profile are drawn, so a seeded draw does not depend on other
+        profiles.
+
+        Args:
+            liked: draw among the liked genres, or among the neutral ones (preference
+                0) if none is liked; disliked genres are never drawn
+
+        Returns: genre, or None if there is nothing to draw from
+
+        """
+        if not liked:
+            genre_ids = self.genre_ids
+        else:
+            genre_ids = self.liked_genres or [genre_id for genre_id in self.genre_ids
+                                              if self.genre_vector[genre_id] == 0]
+        if not genre_ids:
+            return None
+        return GENRES.key(genre_ids[random.randint(0, len(genre_ids) - 1)])
+
+    def sample_liked_movie(self):
+        """Draws a liked movie uniformly with random.randint.
+
+        If no movie is liked, draws among the rated movies that are not disliked
+        (rating of at least 0).
+
+        Returns: movie title or id, or None if there is nothing to draw from
+
+        """
+        movie_ids = self.liked_movies or [movie_id for movie_id, rating
+                                          in zip(self.movie_ids, self.ratings)
+                                          if rating >= 0]
+        if not movie_ids:
+            return None
+        return MOVIES.key(movie_ids[random.randint(0, len(movie_ids) - 1)])
@@ -0,0 +1,236 @@
+"""
+MovieLens ratings loader
+========================
+
+Loads the (userId, movieId, rating) columns of a MovieLens ratings file into a NumPy
+structured array, reading the CSV in chunks with typed columns. The array is saved as
+``.npy`` under ``CACHE_DIR``, keyed by a hash of the ratings file, and memory mapped
+afterwards, so the full ml-20m file (about 240 MB as an array) is parsed only once.
+
+RatingsIndex groups the ratings by user (offsets into a user-sorted copy) and holds
+each user's mean rating per genre, so a user profile is built from a slice of that
+user's ratings instead of aggregating all users. Genre means of all users come from one
+sparse product of the user x movie ratings with the one-hot movie x genre matrix, and
+are thresholded into a -1/0/1 user x genre preference matrix at once.
+"""
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from simulation.cache import file_hash, cache_path
+
+VERSION = 1  # bump when the cached layout changes
+
+RATINGS_DTYPE = np.dtype([("user", np.int32), ("movie", np.int32), ("rating", np.float32)])
+
+_COLUMNS = {"userId": "user", "movieId": "movie", "rating": "rating"}
+
+_LOADED = {}  # {ratings digest: structured array}
+
+_INDEXES = {}  # {(ratings digest, movies digest): RatingsIndex}
+
+
+def read_ratings(rating_file, chunksize=1 << 20):
+    """Reads a ratings file, bypassing the cache.
+
+    Args:
+        rating_file: MovieLens ratings.csv
+        chunksize: number of rows parsed at a time
+
+    Returns: structured array with user, movie and rating fields, in file order
+
+    """
+    chunks = []
+    for chunk in pd.read_csv(rating_file, usecols=list(_COLUMNS), chunksize=chunksize,
+                             dtype={column: RATINGS_DTYPE[field]
+                                    for column, field in _COLUMNS.items()}):
+        ratings = np.empty(len(chunk), dtype=RATINGS_DTYPE)
+        for column, field in _COLUMNS.items():
+            ratings[field] = chunk[column].to_numpy()
+        chunks.append(ratings)
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=RATINGS_DTYPE)
+
+
+def load_ratings(rating_file, chunksize=1 << 20):
+    """Loads a ratings file, parsing it only if it has no cached array.
+
+    Args:
+        rating_file: MovieLens ratings.csv
+        chunksize: number of rows parsed at a time
+
+    Returns: read-only structured array, cf. read_ratings
+
+    """
+    digest = file_hash(rating_file)
+    if digest not in _LOADED:
+        path = cache_path("ratings", "{}-v{}.npy".format(digest, VERSION))
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy")
+            with os.fdopen(fd, "wb") as target:
+                np.save(target, read_ratings(rating_file, chunksize))
+            os.replace(tmp_path, path)
+        _LOADED[digest] = np.load(path, mmap_mode="r")
+    return _LOADED[digest]
+
+
+def genre_matrix(movies):
+    """One-hot encodes the genres of a movie catalogue.
+
+    Args:
+        movies: movie db {movie id: {"title": title, "genres": "A|B"}}, cf.
+            UserGenerator.movies
+
+    Returns: (sorted movie ids, genres in order of first appearance, sparse movie x genre
+        matrix with rows in the order of the movie ids)
+
+    """
+    genres = {}
+    catalogue = sorted(movies, key=int)
+    rows, cols = [], []
+    for i, movie_id in enumerate(catalogue):
+        for genre in movies[movie_id]["genres"].split("|"):
+            rows.append(i)
+            cols.append(genres.setdefault(genre, len(genres)))
+    matrix = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                        shape=(len(catalogue), len(genres)))
+    return np.array([int(movie_id) for movie_id in catalogue], dtype=np.int32), \
+        list(genres), matrix
+
+
+def threshold(values, upper_limit=3.5, lower_limit=2):
+    """Vectorised UserGenerator.rate_pre: 1 at or above upper_limit, -1 at or below
+    lower_limit, 0 otherwise (including NaN).
+
+    Args:
+        values: array of ratings
+        upper_limit: threshold of being positive
+        lower_limit: threshold of being negative
+
+    Returns: int8 array of preferences
+
+    """
+    preferences = np.zeros(np.shape(values), dtype=np.int8)
+    preferences[values >= upper_limit] = 1
+    preferences[values <= lower_limit] = -1
+    return preferences
+
+
+class RatingsIndex:
+    """Ratings grouped by user, with per-user genre means.
+
+    The ratings of the i-th user (users[i]) are movie_ids[indptr[i]:indptr[i + 1]] and
+    ratings[indptr[i]:indptr[i + 1]], in file order. genre_means, genre_counts and
+    genre_preferences are user x genre matrices, with columns in the order of genres.
+    """
+
+    def __init__(self, ratings, movies):
+        """Sorts the ratings by user and averages them per user and genre.
+
+        Args:
+            ratings: structured array, cf. read_ratings
+            movies: movie db {movie id: {"title": title, "genres": "A|B"}}, cf.
+                UserGenerator.movies
+        """
+        self.movies = movies
+        order = np.argsort(ratings["user"], kind="stable")
+        users = ratings["user"][order]
+        self.users, starts = np.unique(users, return_index=True)
+        self.indptr = np.append(starts, len(users)).astype(np.int64)
+        self.movie_ids = ratings["movie"][order]
+        self.ratings = ratings["rating"][order]
+
+        self.catalogue, self.genres, self.movie_genres = genre_matrix(movies)
+        user_rows = np.repeat(np.arange(len(self.users)), np.diff(self.indptr))
+        columns = np.searchsorted(self.catalogue, self.movie_ids)
+        shape = (len(self.users), len(self.catalogue))
+        user_movies = csr_matrix((self.ratings.astype(np.float64), (user_rows, columns)),
+                                 shape=shape)
+        rated = csr_matrix((np.ones(len(columns)), (user_rows, columns)), shape=shape)
+        sums = (user_movies @ self.movie_genres).toarray()
+        self.genre_counts = (rated @ self.movie_genres).toarray()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # NaN where the user rated no movie of the genre
+            self.genre_means = sums / self.genre_counts
+        self.genre_preferences = threshold(self.genre_means)
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, user_id):
+        return self.row(user_id) is not None
+
+    def row(self, user_id):
+        """Returns the row of a user.
+
+        Args:
+            user_id: MovieLens user id
+
+        Returns: row index, or None for an unknown user
+
+        """
+        i = int(np.searchsorted(self.users, int(user_id)))
+        return i if i < len(self.users) and self.users[i] == int(user_id) else None
+
+    def user_ratings(self, user_id):
+        """Returns the ratings of a user.
+
+        Args:
+            user_id: MovieLens user id
+
+        Returns: (movie ids, ratings) arrays in file order
+
+        Raises:
+            KeyError: for an unknown user
+
+        """
+        i = self.row(user_id)
+        if i is None:
+            raise KeyError("Unknown user {}".format(user_id))
+        return (self.movie_ids[self.indptr[i]:self.indptr[i + 1]],
+                self.ratings[self.indptr[i]:self.indptr[i + 1]])
+
+    def user_genres(self, user_id):
+        """Returns the genres a user has rated, in order of first appearance.
+
+        Args:
+            user_id: MovieLens user id
+
+        Returns: list of genres
+
+        """
+        movie_ids, _ = self.user_ratings(user_id)
+        return list(dict.fromkeys(genre for movie_id in movie_ids.tolist()
+                                  for genre in self.movies[str(movie_id)]["genres"].split("|")))
+
+    @classmethod
+    def load(cls, rating_file, movie_file, movies):
+        """Loads the index of a ratings file once per process.
+
+        The index is cached by the contents of both files.
+
+        Args:
+            rating_file: MovieLens ratings.csv
+            movie_file: MovieLens movies.csv
+            movies: movie db read from movie_file, cf. UserGenerator.movies
+
+        Returns: ratings index
+
+        """
+        key = (file_hash(rating_file), file_hash(movie_file))
+        if key not in _INDEXES:
+            _INDEXES[key] = cls(load_ratings(rating_file), movies)
+        return _INDEXES[key]
+
+
+if __name__ == "__main__":
+    import timeit
+
+    print("parse: {:.3f} s".format(
+        timeit.timeit(lambda: read_ratings("data/ratings.csv"), number=1)))
+    load_ratings("data/ratings.csv")
+    _LOADED.clear()
+    print("load from cache: {:.4f} s".format(
+        timeit.timeit(lambda: load_ratings("data/ratings.csv"), number=1)))
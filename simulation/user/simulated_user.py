@@ -8,6 +8,7 @@ Author: Shuo Zhang, Krisztian Balog
 """
 
 from pprint import pprint
+from simulation.user.profile import UserProfile
 from simulation.user.user import User
 
 
@@ -17,9 +18,24 @@ class SimulatedUser(User):
     def __init__(self, persona, preferences):
         super(User, self).__init__()
         self.persona = persona
-        self.preferences = preferences
+        self.user_profile = UserProfile.from_preferences(preferences)
         self._current_intent = None
 
+    @property
+    def preferences(self):
+        """Preferences in the dictionary format, cf. UserProfile.to_preferences.
+
+        The dictionaries are built on access; changes must go through update_persona.
+
+        Returns: [{movie: rating}, {genre: preference}]
+
+        """
+        return self.user_profile.to_preferences()
+
+    @preferences.setter
+    def preferences(self, preferences):
+        self.user_profile = UserProfile.from_preferences(preferences)
+
     def init_dialog(self):
         """Initiates dialog with the conversational system.
 
@@ -64,4 +80,4 @@ class SimulatedUser(User):
             rate: the movie rate
 
         """
-        self.preferences[0][movie] = rate
+        self.user_profile.rate(movie, rate)
@@ -0,0 +1,221 @@
+"""
+Transition samplers
+===================
+
+Samplers over transition tables of the form {state: {next state: occurrence}}, as
+counted from annotated dialogue corpora (cf. CorpusModel).
+
+    - TransitionTable draws a next state with one binary search over precomputed
+      cumulative probabilities, instead of renormalising the counts on every draw.
+    - AgendaSampler draws complete agendas (state sequences ending in "Stop") from
+      the Markov chain conditioned on constraints on the agenda, i.e. without
+      rejecting and redrawing agendas that violate them. It can also draw a batch of
+      agendas with vectorised NumPy operations.
+
+Single draws take their uniform numbers from the ``random`` module by default, so they
+follow ``random.seed`` like the rest of the simulation.
+"""
+
+import random
+from bisect import bisect_right
+import numpy as np
+
+STOP = "Stop"
+
+
+def cumulative(counts):
+    """Turns counts into cumulative probabilities; the last one is exactly 1.
+
+    Args:
+        counts: list of non-negative numbers with a positive sum
+
+    Returns: list of cumulative probabilities
+
+    """
+    cum = (np.cumsum(counts, dtype=float) / sum(counts)).tolist()
+    cum[-1] = 1.0
+    return cum
+
+
+class TransitionTable:
+    """Precompiled transition table"""
+
+    def __init__(self, stat):
+        """Compiles the table.
+
+        Args:
+            stat: {state: {next state: occurrence}}
+        """
+        self.stat = stat
+        self._rows = {state: (tuple(nexts), cumulative(list(nexts.values())))
+                      for state, nexts in stat.items() if sum(nexts.values()) > 0}
+        # All states, in order of first appearance; STOP is not a state
+        self.states = list(dict.fromkeys(
+            [state for state in stat] +
+            [nxt for nexts in stat.values() for nxt in nexts if nxt != STOP]))
+
+    def __contains__(self, state):
+        return state in self._rows
+
+    def probabilities(self, state):
+        """Returns the transition probabilities of a state.
+
+        Args:
+            state: state
+
+        Returns: {next state: probability}, empty if the state has no transitions
+
+        """
+        nexts = self.stat.get(state, {})
+        total = sum(nexts.values())
+        return {nxt: count / total for nxt, count in nexts.items()} if total else {}
+
+    def sample(self, state, u=None):
+        """Draws the next state.
+
+        Args:
+            state: current state
+            u: uniform number in [0, 1); drawn with random.random if omitted
+
+        Returns: next state, or None if the state has no transitions
+
+        """
+        row = self._rows.get(state)
+        if row is None:
+            return None
+        nexts, cum = row
+        u = random.random() if u is None else u
+        return nexts[min(bisect_right(cum, u), len(nexts) - 1)]
+
+
+class AgendaSampler:
+    """Samples agendas conditioned on a required state and a maximum length.
+
+    An agenda starts in the start state and follows the transition table until STOP,
+    which is not part of the agenda. Only agendas with the required state among their
+    first `within` states and at most `max_len` states are drawn, with the same
+    probabilities as sampling agendas until one satisfies the constraints.
+
+    The probability of satisfying the constraints from each (position, state, required
+    state seen) triple is computed by backward induction; transitions are then drawn
+    with probabilities reweighted by it.
+    """
+
+    def __init__(self, table, start, required, within, max_len):
+        """Compiles the conditional transition tables.
+
+        Args:
+            table: TransitionTable
+            start: first state of every agenda
+            required: state that must occur among the first `within` states
+            within: number of leading states searched for the required state
+            max_len: maximum number of states
+
+        Raises:
+            ValueError: if no agenda satisfies the constraints
+        """
+        self.states = list(table.states)
+        self.start = start
+        self.max_len = max_len
+        self.within = within
+        index = {state: i for i, state in enumerate(self.states)}
+        num = len(self.states)
+        if start not in index:
+            raise ValueError("Unknown start state {}".format(start))
+        # Transition probabilities; column num stands for STOP
+        prob = np.zeros((num, num + 1))
+        for state, nexts in table.stat.items():
+            for nxt, p in table.probabilities(state).items():
+                prob[index[state], num if nxt == STOP else index[nxt]] = p
+        self._is_required = np.array([state == required for state in self.states])
+
+        # weight[i, s, d]: probability of a valid agenda given state s at position i,
+        # where d tells whether the required state occurred up to position i
+        weight = np.zeros((max_len + 1, num, 2))
+        cum = np.zeros((max_len, 2, num, num + 1))
+        for i in reversed(range(max_len)):
+            for seen in (0, 1):
+                if not seen and i >= within - 1:
+                    continue  # the required state can no longer occur in time
+                seen_next = (seen | (self._is_required & (i + 1 < within))).astype(int)
+                row = np.empty((num, num + 1))
+                row[:, :num] = prob[:, :num] * weight[i + 1, np.arange(num), seen_next]
+                row[:, num] = prob[:, num] * seen
+                weight[i, :, seen] = row.sum(axis=1)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    cum[i, seen] = np.nan_to_num(
+                        np.cumsum(row, axis=1) / weight[i, :, seen][:, None], nan=1.0)
+                cum[i, seen, :, num] = 1.0
+        self._seen_start = int(start == required and within > 0)
+        self.probability = weight[0, index[start], self._seen_start]
+        if self.probability <= 0:
+            raise ValueError("No agenda satisfies the constraints")
+        self._cum = cum
+        self._cum_rows = cum.tolist()
+        self._required_rows = self._is_required.tolist()
+        self._start = index[start]
+
+    def sample(self, u=None):
+        """Draws one agenda.
+
+        Args:
+            u: function returning uniform numbers in [0, 1); random.random if omitted
+
+        Returns: list of states
+
+        """
+        u = u or random.random
+        num = len(self.states)
+        state, seen = self._start, self._seen_start
+        agenda = [self.start]
+        for i in range(self.max_len):
+            nxt = min(bisect_right(self._cum_rows[i][seen][state], u()), num)
+            if nxt == num:
+                break
+            state, seen = nxt, int(seen or (self._required_rows[nxt] and i + 1 < self.within))
+            agenda.append(self.states[nxt])
+        return agenda
+
+    def sample_batch(self, n, seed=None):
+        """Draws a batch of agendas with vectorised operations.
+
+        Args:
+            n: number of agendas
+            seed: seed or numpy Generator
+
+        Returns: list of agendas (lists of states)
+
+        """
+        rng = np.random.default_rng(seed)
+        num = len(self.states)
+        paths = np.full((n, self.max_len), -1)
+        paths[:, 0] = self._start
+        state = np.full(n, self._start)
+        seen = np.full(n, self._seen_start)
+        alive = np.arange(n)
+        for i in range(self.max_len):
+            if not len(alive):
+                break
+            rows = self._cum[i, seen[alive], state[alive]]
+            nxt = np.minimum((rows <= rng.random(len(alive))[:, None]).sum(axis=1), num)
+            alive = alive[nxt < num]
+            nxt = nxt[nxt < num]
+            if i + 1 < self.max_len:
+                paths[alive, i + 1] = nxt
+            state[alive] = nxt
+            seen[alive] |= self._is_required[nxt] & (i + 1 < self.within)
+        states = self.states
+        return [[states[j] for j in path if j >= 0] for path in paths.tolist()]
+
+
+if __name__ == "__main__":
+    import timeit
+    from simulation.user.movies.corpus_model import CorpusModel
+
+    SAMPLER = CorpusModel.load("data/1224_ms.json").agenda_sampler
+    NUMBER = 10000
+    print("P(constraints) = {:.3f}".format(SAMPLER.probability))
+    print("sample: {:.2f} us per agenda".format(
+        timeit.timeit(SAMPLER.sample, number=NUMBER) / NUMBER * 1e6))
+    print("sample_batch: {:.2f} us per agenda".format(
+        timeit.timeit(lambda: SAMPLER.sample_batch(NUMBER, seed=0), number=1) / NUMBER * 1e6))
@@ -19,12 +19,17 @@ Author: Shuo Zhang
 import os
 import csv
 import random
+import numpy as np
+from simulation.cache import file_hash
+from simulation.user.ratings import load_ratings, RatingsIndex
 from simulation.user.simulated_user import SimulatedUser
 
 MOVIELEN_PATH = ""
 MOVIE_FILE = "data/movies.csv"
 RATING_FILE = "data/ratings.csv"
 
+_MOVIES = {}  # {movies digest: movie db}, loaded once per process
+
 
 class UserGenerator:
     """Class for generating random users."""
@@ -36,16 +41,22 @@ class UserGenerator:
     def movies():
         """Loads movies with genres.
 
+        The movie db is loaded once per process and shared; it must not be modified.
+
         Returns: movie db
 
         """
-        mov = dict()
-        with open(os.path.join(MOVIELEN_PATH, MOVIE_FILE)) as movie_file:
-            csv_data = csv.reader(movie_file)
-            next(csv_data, None)
-            for line in csv_data:
-                mov[line[0]] = {"title": line[1], "genres": line[2]}
-        return mov
+        path = os.path.join(MOVIELEN_PATH, MOVIE_FILE)
+        digest = file_hash(path)
+        if digest not in _MOVIES:
+            mov = dict()
+            with open(path) as movie_file:
+                csv_data = csv.reader(movie_file)
+                next(csv_data, None)
+                for line in csv_data:
+                    mov[line[0]] = {"title": line[1], "genres": line[2]}
+            _MOVIES[digest] = mov
+        return _MOVIES[digest]
 
     @staticmethod
     def samp(pro, dist, attribute):
@@ -85,40 +96,81 @@ class UserGenerator:
         else:
             return 0
 
-    def rates(self, if_title=True):
+    def rates(self, if_title=True, max_ratings=500000):
         """Dumps the ratings to get genres preferences over files.
 
         genre_preference = sum preference_of_movie_has_this_genre / num_of_movie_has_this genre
 
+        Ratings are read with the typed loader, cf. simulation.user.ratings. The dump is
+        built in Python dictionaries, so by default only the leading ratings are used;
+        profiles over all ratings come from ratings_index instead.
+
         Args:
             if_title: to display movie id or movie title
+            max_ratings: number of leading ratings to use; all ratings if None (slow for
+                large files, e.g. 20M rows of ml-20m)
 
         Returns: all user ratings
 
         """
         user_all = {}
         self.__mov = self.movies()
-        with open(os.path.join(MOVIELEN_PATH, RATING_FILE)) as rating_file:
-            csv_data = csv.reader(rating_file)
-            next(csv_data, None)
-            for i, line in enumerate(csv_data):
-                if i == 500000:
-                    break
-                user_id, movie_id, rating, _ = line
-                genres = self.__mov.get(movie_id).get("genres")
-                title = self.__mov.get(movie_id).get("title")
-                if user_id not in user_all:
-                    user_all[user_id] = {"movies": {}, "genres": {}}
-                if if_title:
-                    user_all[user_id]["movies"][title] = self.rate_pre(rate=rating)
-                else:
-                    user_all[user_id]["movies"][movie_id] = self.rate_pre(rate=rating)
-                for genre in genres.split("|"):
-                    if genre not in user_all[user_id]["genres"]:
-                        user_all[user_id]["genres"][genre] = []
-                    user_all[user_id]["genres"][genre].append(rating)
+        ratings = load_ratings(os.path.join(MOVIELEN_PATH, RATING_FILE))[:max_ratings]
+        for user_id, movie_id, rating in zip(ratings["user"].tolist(),
+                                             ratings["movie"].tolist(),
+                                             ratings["rating"].tolist()):
+            user_id, movie_id = str(user_id), str(movie_id)
+            genres = self.__mov.get(movie_id).get("genres")
+            title = self.__mov.get(movie_id).get("title")
+            if user_id not in user_all:
+                user_all[user_id] = {"movies": {}, "genres": {}}
+            if if_title:
+                user_all[user_id]["movies"][title] = self.rate_pre(rate=rating)
+            else:
+                user_all[user_id]["movies"][movie_id] = self.rate_pre(rate=rating)
+            for genre in genres.split("|"):
+                if genre not in user_all[user_id]["genres"]:
+                    user_all[user_id]["genres"][genre] = []
+                user_all[user_id]["genres"][genre].append(rating)
         return user_all
 
+    def ratings_index(self):
+        """Loads the ratings grouped by user, once per process.
+
+        Returns: RatingsIndex
+
+        """
+        return RatingsIndex.load(os.path.join(MOVIELEN_PATH, RATING_FILE),
+                                 os.path.join(MOVIELEN_PATH, MOVIE_FILE), self.movies())
+
+    def profile(self, user_id, num_movie=8, num_genre=8, if_title=True):
+        """Creates the initial profile of a MovieLens user.
+
+        Only the ratings of this user are read, cf. RatingsIndex.
+
+        Args:
+            user_id: MovieLens user id
+            num_movie: number of movies with references
+            num_genre: number of geners with references
+            if_title: to dispplay movie id or movie title
+
+        Returns: simulated user
+
+        """
+        index = self.ratings_index()
+        movie_ids, ratings = index.user_ratings(user_id)
+        movies = self.movies()
+        user_movies = {}
+        for movie_id, rating in zip(movie_ids.tolist(), ratings.tolist()):
+            key = movies[str(movie_id)]["title"] if if_title else str(movie_id)
+            user_movies[key] = self.rate_pre(rate=rating)
+        movie = dict(list(user_movies.items())[:num_movie])
+        preferences = index.genre_preferences[index.row(user_id)].tolist()
+        genre_ids = {genre: i for i, genre in enumerate(index.genres)}
+        genres_samp = {genre: preferences[genre_ids[genre]]
+                       for genre in index.user_genres(user_id)[:num_genre]}
+        return SimulatedUser(persona={}, preferences=[movie, genres_samp])
+
     def initial(self, num_user=5, num_movie=8, num_genre=8, if_title=True):
         """Creates example initial user profiles.
 
@@ -131,24 +183,45 @@ class UserGenerator:
         Returns: all users
 
         """
-        user_all = self.rates(if_title=if_title)
         users = list()
         for _ in range(num_user):
-            user_id = str(random.randint(1, 700))
-            movie = {v: user_all.get(user_id).get("movies")[v] for v in
-                     [list(user_all.get(user_id).get("movies").keys())[k]
-                      for k in range(num_movie)]}
-            genres = user_all.get(user_id).get("genres")
-            genres_norm = {k: self.rate_pre(sum([float(k) for k in v]) / len(v), 3.5, 2)
-                           for k, v in genres.items()}
-            genres_samp = {v: genres_norm[v] for v in [list(genres_norm.keys())[k]
-                                                       for k in range(num_genre)]}
-            user = SimulatedUser(persona={}, preferences=[movie, genres_samp])
+            user_id = random.randint(1, 700)
+            user = self.profile(user_id, num_movie=num_movie, num_genre=num_genre,
+                                if_title=if_title)
             user.print_user()
             users.append(user)
         return users
 
 
+    def population(self, num_user, seed=None, num_movie=8, num_genre=8, if_title=True):
+        """Generates profiles of distinct MovieLens users, lazily and without printing.
+
+        Users are drawn without replacement from all users of the ratings file with a
+        numpy Generator, so the same seed gives the same population.
+
+        Args:
+            num_user: number of users
+            seed: seed or numpy Generator
+            num_movie: number of movies with references
+            num_genre: number of geners with references
+            if_title: to dispplay movie id or movie title
+
+        Returns: generator of simulated users
+
+        Raises:
+            ValueError: if there are fewer than num_user users
+
+        """
+        users = self.ratings_index().users
+        if num_user > len(users):
+            raise ValueError("Cannot sample {} of {} users".format(num_user, len(users)))
+        user_ids = np.random.default_rng(seed).choice(users, size=num_user, replace=False)
+        return (self.profile(user_id, num_movie=num_movie, num_genre=num_genre,
+                             if_title=if_title) for user_id in user_ids.tolist())
+
+
 if __name__ == "__main__":
     PERSON = UserGenerator()
     # print(PERSON.initial(num_user=10, num_movie=5, num_genre=5, if_title=True))
+    for USER in PERSON.population(num_user=3, seed=0, num_movie=5, num_genre=5):
+        USER.print_user()
@@ -0,0 +1,54 @@
+"""
+Tests of MovieNLU
+=================
+
+Run from the repository root: python -m pytest tests
+"""
+
+import pytest
+import yaml
+from simulation.bot.jmrs1.Dialogue.Action import DialogueAct
+from simulation.bot.jmrs1.Domain.DataBase import SQLDataBase
+from simulation.bot.jmrs1.Domain.Ontology import Ontology
+from simulation.bot.jmrs1.NLU.MovieNLU import MovieNLU
+
+CONFIG_FILE = "simulation/bot/jmrs1/config/movies_text.yaml"
+
+# Expected results of raw_utterance: (utterance, result without and with a previous
+# offer, None if the same), including the cascades of the chained replacements of
+# RAW_UTTERANCE_REWRITES
+RAW_UTTERANCE_EXAMPLES = [
+    ("Who is the director name?", "who is the director_name", None),
+    ("director nolan", "director_namenolan", None),
+    ("Tell me about the directors",
+     "tell me plot_keywords the director_name", None),
+    ("What is the IMDb score?", "what is the imdb_score", None),
+    ("What rating does it have?", "what imdb_score does it have", None),
+    ("a good moive please", "a good genres please", None),
+    ("What is the plot of it?", "what is the plot_keywordsof it", None),
+    ("Who stars in it", "who actors in it", None),
+    ("starstar", "actoractors", None),
+    ("plot tars", "plot_keywordactors", None),
+    ("When was it released?", "when was it title_title_year", None),
+    ("Which year?", "which title_year", None),
+    ("How long is it?", "how duration is it", None),
+    ("longenre x", "durationenres x", None),
+    ("No, I do not like it.", "no i do not like it",
+     "no i do not like it genres genres"),
+    ("Hello!", "hello", None),
+]
+
+
+@pytest.fixture(scope="module")
+def nlu():
+    with open(CONFIG_FILE) as config_file:
+        config = yaml.load(config_file, Loader=yaml.Loader)["DIALOGUE"]
+    return MovieNLU({"ontology": Ontology(config["ontology_path"]),
+                     "database": SQLDataBase(config["db_path"])})
+
+
+@pytest.mark.parametrize("utterance, expected, expected_offer", RAW_UTTERANCE_EXAMPLES)
+def test_raw_utterance(nlu, utterance, expected, expected_offer):
+    assert nlu.raw_utterance(utterance, None) == expected
+    assert nlu.raw_utterance(utterance, DialogueAct("offer", [])) == \
+        (expected_offer or expected)